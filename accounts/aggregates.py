@@ -0,0 +1,192 @@
+"""Incrementally maintained totals for the stats endpoint.
+
+Every change to an account's balance must be recorded here in the same
+transaction; new and deleted accounts are counted by signal handlers, however
+they are created (the API, ``createsuperuser``, the admin). ``rebuild()`` recomputes the totals from the accounts
+table, e.g. after balances were edited in the admin.
+
+Changes to the bank account's balance that come with deposits and withdrawals
+are not written to its row either: they accumulate in sharded ``bank_pending``
+rows and are folded into the row by ``fold_bank_balance()``. Otherwise every
+money movement in the system would serialize on the bank row's lock.
+``bank_balance()`` is always exact.
+"""
+
+import random
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Account, AccountAggregate
+
+Name = AccountAggregate.Name
+
+# Totals that can be recomputed from the accounts table
+TOTALS = [Name.ACCOUNTS, Name.ASSETS, Name.LIABILITIES]
+
+
+def increment(name, delta):
+    """Add ``delta`` to a random shard of the named total."""
+    if not delta:
+        return
+    shard = random.randrange(settings.DJANGO_AGGREGATE_SHARDS)
+    rows = AccountAggregate.objects.filter(name=name, shard=shard)
+    if not rows.update(value=F("value") + delta):
+        # Shard row doesn't exist yet (e.g. DJANGO_AGGREGATE_SHARDS was raised)
+        AccountAggregate.objects.get_or_create(name=name, shard=shard)
+        rows.update(value=F("value") + delta)
+
+
+@receiver(post_save, sender=Account)
+def count_created_account(sender, instance, created, raw=False, **kwargs):
+    # Like compute(), superusers aren't counted; fixtures are rebuilt after
+    if created and not raw and not instance.is_superuser:
+        increment(Name.ACCOUNTS, 1)
+
+
+@receiver(post_delete, sender=Account)
+def count_deleted_account(sender, instance, **kwargs):
+    if not instance.is_superuser:
+        increment(Name.ACCOUNTS, -1)
+
+
+def record_balance_changes(*changes, bank_delta=0):
+    """Record ``(account, delta)`` balance changes in assets and liabilities.
+
+    ``bank_delta`` is a change of the bank account's balance that was not
+    applied to its row; it is added to assets and left pending for the next fold.
+
+    Changes are netted per total and applied in name order, the same order
+    ``rebuild()`` and ``verify()`` lock shards in, so a transaction locks at most
+    one shard per total and can't deadlock with them.
+    """
+    net = dict.fromkeys(Name.values, 0)
+    for account, delta in changes:
+        net[Name.ASSETS if account.is_staff else Name.LIABILITIES] += delta
+    net[Name.ASSETS] += bank_delta
+    net[Name.BANK_PENDING] += bank_delta
+    for name in sorted(net):
+        increment(name, net[name])
+
+
+def _sum_shards(name):
+    return (
+        AccountAggregate.objects.filter(name=name)
+        .order_by()
+        .values("name")
+        .annotate(total=Sum("value"))
+        .values("total")
+    )
+
+
+def totals():
+    """Current value of every total, in one query."""
+    values = dict.fromkeys(Name.values, 0)
+    values.update(
+        AccountAggregate.objects.values("name")
+        .annotate(total=Sum("value"))
+        .values_list("name", "total")
+    )
+    return values
+
+
+def bank_balance():
+    """The bank account's balance including unfolded changes, in one query."""
+    return (
+        Account.objects.filter(username=settings.DJANGO_BANK_WALLET)
+        .annotate(pending=Coalesce(Subquery(_sum_shards(Name.BANK_PENDING)), Value(0)))
+        .values_list(F("balance") + F("pending"), flat=True)
+        .first()
+    )
+
+
+def fold_bank_balance():
+    """Move pending changes into the bank account's row. Returns the amount moved."""
+    with transaction.atomic():
+        # Account rows are locked before aggregate shards, like transfers do
+        bank = list(
+            Account.objects.select_for_update()
+            .filter(username=settings.DJANGO_BANK_WALLET)
+            .values_list("id", flat=True)
+        )
+        if not bank:
+            return 0  # No bank account yet, keep the changes pending
+        shards = list(
+            AccountAggregate.objects.select_for_update()
+            .filter(name=Name.BANK_PENDING)
+            .order_by("shard")
+        )
+        pending = sum(shard.value for shard in shards)
+        if not pending:
+            return 0
+        Account.objects.filter(id=bank[0]).update(
+            balance=F("balance") + pending, balance_version=F("balance_version") + 1
+        )
+        AccountAggregate.objects.filter(name=Name.BANK_PENDING).update(value=0)
+    return pending
+
+
+def compute():
+    """Compute every total from scratch from the accounts table."""
+    bank_pending = AccountAggregate.objects.filter(name=Name.BANK_PENDING).aggregate(
+        total=Sum("value")
+    )["total"]
+    return {
+        # Exclude superuser from account count
+        Name.ACCOUNTS: Account.objects.filter(is_superuser=False).count(),
+        # Assets are balances of owned accounts (ecash coinbank holds)
+        Name.ASSETS: (
+            Account.objects.filter(is_staff=True).aggregate(total=Sum("balance"))[
+                "total"
+            ]
+            or 0
+        )
+        + (bank_pending or 0),
+        # Liabilities are balances of non-owned accounts (what users hold)
+        Name.LIABILITIES: Account.objects.filter(is_staff=False).aggregate(
+            total=Sum("balance")
+        )["total"]
+        or 0,
+    }
+
+
+def _lock_shards():
+    # Writers wait on their shard row, so with every shard locked the accounts
+    # table and the totals can be read consistently
+    list(AccountAggregate.objects.select_for_update().order_by("name", "shard"))
+
+
+def verify():
+    """Return ``{name: (stored, actual)}`` for every total that has drifted."""
+    with transaction.atomic():
+        _lock_shards()
+        stored = totals()
+        actual = compute()
+    return {
+        name: (stored[name], actual[name])
+        for name in TOTALS
+        if stored[name] != actual[name]
+    }
+
+
+def rebuild():
+    """Recompute every total and reset its shards. Returns the new totals."""
+    with transaction.atomic():
+        AccountAggregate.objects.bulk_create(
+            [
+                AccountAggregate(name=name, shard=shard)
+                for name in Name.values
+                for shard in range(settings.DJANGO_AGGREGATE_SHARDS)
+            ],
+            ignore_conflicts=True,
+        )
+        _lock_shards()
+        actual = compute()
+        AccountAggregate.objects.filter(name__in=TOTALS).update(value=0)
+        for name, value in actual.items():
+            AccountAggregate.objects.filter(name=name, shard=0).update(value=value)
+    return actual
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class AccountsConfig(AppConfig):
     name = "accounts"
+
+    def ready(self):
+        # Connects the account count and the cache invalidation
+        from . import aggregates, auth, balances  # noqa: F401
@@ -0,0 +1,58 @@
+"""Authentication backend that caches logged-in users.
+
+``AuthenticationMiddleware`` loads ``request.user`` on every request. This
+backend keeps users in the cache for ``DJANGO_USER_CACHE_SECONDS`` and drops
+them whenever the account is saved or deleted. Balances change with UPDATEs
+that don't go through ``save()``, so they are never cached: ``balance`` is
+deferred, and reading ``user.balance`` always queries it.
+
+Users are only cached in a cache shared between processes
+(``DJANGO_CACHE_SHARED``): otherwise revoking staff, deactivating an account or
+changing a password would only be seen by the worker that saved it. Cached users
+are read from the primary, never from a lagging replica.
+"""
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .db import in_db_thread
+from .models import Account
+
+
+def cache_key(user_id):
+    return f"accounts:user:{user_id}"
+
+
+class CachedModelBackend(ModelBackend):
+    def get_user(self, user_id):
+        if not settings.DJANGO_CACHE_SHARED:
+            return super().get_user(user_id)
+        key = cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            try:
+                user = (
+                    Account._default_manager.using(DEFAULT_DB_ALIAS)
+                    .defer("balance")
+                    .get(pk=user_id)
+                )
+            except Account.DoesNotExist:
+                return None
+            cache.set(key, user, settings.DJANGO_USER_CACHE_SECONDS)
+        return user if self.user_can_authenticate(user) else None
+
+    async def aget_user(self, user_id):
+        return await in_db_thread(self.get_user)(user_id)
+
+
+@receiver(post_save, sender=Account)
+@receiver(post_delete, sender=Account)
+def forget_user(sender, instance, **kwargs):
+    # After commit too, in case a request cached the old row in the meantime
+    key = cache_key(instance.pk)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
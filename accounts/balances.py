@@ -0,0 +1,117 @@
+"""Cache of account balances, kept current by the transactions that change them.
+
+Every UPDATE of a balance also increments the account's ``balance_version``.
+``accounts.transfers`` stores the new ``(version, balance)`` once its
+transaction commits; a cached entry is only ever replaced by a newer version,
+so a late writer can't put back an older balance. Entries expire after
+``DJANGO_BALANCE_CACHE_SECONDS``, which bounds what a lost race can leave
+behind, and are dropped when an account is saved. The bank account's balance
+has pending parts (see ``accounts.aggregates``) and is not cached.
+
+Balances change in every process (web workers, ``settledeposits``), so they
+are only cached in a cache all of them share. With a per-process cache, such
+as the default ``LocMemCache``, every read goes to the database.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import aggregates, ledger
+from .models import Account
+
+
+def enabled():
+    """Whether balances are cached, i.e. the cache is shared between processes."""
+    return settings.DJANGO_CACHE_SHARED
+
+
+def cache_key(account_id):
+    return f"accounts:balance:{account_id}"
+
+
+def get(account_id):
+    """The cached ``(version, balance)`` of an account, or None."""
+    if not enabled():
+        return None
+    return cache.get(cache_key(account_id))
+
+
+def _store_many(entries):
+    if not enabled():
+        return
+    entries = {
+        cache_key(account_id): (version, balance)
+        for account_id, (balance, version) in entries.items()
+    }
+    cached = cache.get_many(entries)
+    newer = {
+        key: entry
+        for key, entry in entries.items()
+        if key not in cached or cached[key][0] < entry[0]
+    }
+    cache.set_many(newer, settings.DJANGO_BALANCE_CACHE_SECONDS)
+
+
+def _store(account_id, balance, version):
+    _store_many({account_id: (balance, version)})
+
+
+def store_many(entries):
+    """Cache ``{account_id: (balance, version)}`` when the transaction commits.
+
+    One callback reads and writes the cache once for all of them.
+    """
+    if enabled():
+        transaction.on_commit(lambda: _store_many(entries))
+
+
+def store(account_id, balance, version):
+    """Cache a balance once the current transaction (if any) commits."""
+    store_many({account_id: (balance, version)})
+
+
+def current(account_id):
+    """An account's ``(version, balance)``, from the cache or the database."""
+    cached = get(account_id)
+    if cached is not None:
+        return cached
+    # From the primary: a lagging replica's balance could be cached for long
+    balance, version = (
+        Account.objects.using(DEFAULT_DB_ALIAS)
+        .values_list("balance", "balance_version")
+        .get(id=account_id)
+    )
+    _store(account_id, balance, version)
+    return version, balance
+
+
+def covers(account_id, amount):
+    """Whether an account's balance covers ``amount``, to reject early.
+
+    A cached balance that doesn't cover it is checked against the database
+    first. The debit itself stays the authoritative check.
+    """
+    if account_id == ledger.bank_account_id():
+        return aggregates.bank_balance() >= amount
+    cached = get(account_id)
+    if cached is not None and cached[1] >= amount:
+        return True
+    forget(account_id)
+    return current(account_id)[1] >= amount
+
+
+def forget(account_id):
+    if enabled():
+        cache.delete(cache_key(account_id))
+
+
+@receiver(post_save, sender=Account)
+@receiver(post_delete, sender=Account)
+def forget_balance(sender, instance, **kwargs):
+    # save() may write a balance (e.g. from the admin) without going through
+    # accounts.transfers; after commit too, like accounts.auth does for users
+    forget(instance.pk)
+    transaction.on_commit(lambda: forget(instance.pk))
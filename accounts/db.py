@@ -0,0 +1,66 @@
+"""Bounded thread pool for the ORM calls of async code.
+
+``sync_to_async`` runs thread-sensitive functions in one thread per request
+(and in one thread shared by everything outside a request, like the wallet
+manager's and the settlement worker's tasks), creating threads without bound.
+Functions wrapped with ``in_db_thread`` run in a pool of ``DJANGO_DB_THREADS``
+threads instead: that many queries run at the same time, whichever requests or
+tasks they come from, and no more than the database connections allow.
+
+Every pool thread keeps its own connection between calls, also with the
+default ``CONN_MAX_AGE`` of 0: the threads live as long as the process, and a
+connection per call would mean several per request. After each call, as Django
+does after requests, a connection is closed if it errored and no longer works,
+or if it is older than a non-zero ``CONN_MAX_AGE``.
+"""
+
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.DJANGO_DB_THREADS, thread_name_prefix="db"
+            )
+        return _executor
+
+
+def _close_unusable_connections():
+    for connection in connections.all(initialized_only=True):
+        if connection.settings_dict["CONN_MAX_AGE"] == 0:
+            connection.close_at = None  # Kept while it works, see above
+        connection.close_if_unusable_or_obsolete()
+
+
+def _run(func, *args, **kwargs):
+    try:
+        return func(*args, **kwargs)
+    finally:
+        _close_unusable_connections()
+
+
+def in_db_thread(func):
+    """Make a sync function that uses the ORM awaitable, run in the DB pool."""
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        # Like sync_to_async, the caller's context variables are carried over
+        run = sync_to_async(
+            functools.partial(_run, func),
+            thread_sensitive=False,
+            executor=_get_executor(),
+        )
+        return await run(*args, **kwargs)
+
+    return wrapper
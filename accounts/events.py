@@ -0,0 +1,224 @@
+"""Account events (balance changes, settled payment requests) for SSE clients.
+
+``publish()`` is called from the transaction that made the change. With the
+default ``local`` backend events are delivered to this process's subscribers
+once the transaction commits. With ``DJANGO_EVENTS_BACKEND=postgres`` they are
+sent with ``pg_notify`` (which Postgres also delivers on commit) and every web
+worker LISTENs for them, so changes made by other workers or by the
+settlement worker reach all connected clients. Each notification carries a list
+of events; ``publish_many()`` packs as many as fit into each and sends them all
+with one statement.
+"""
+
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from contextlib import asynccontextmanager
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "coinbank_events"
+
+# Postgres rejects NOTIFY payloads of 8000 bytes or more
+MAX_PAYLOAD_BYTES = 7900
+
+BALANCE = "balance"
+PAYMENT_REQUEST = "payment_request"
+# First event of every stream: whether events of other processes are delivered
+STREAM = "stream"
+
+
+def cross_process():
+    """Whether events from other processes (e.g. settledeposits) are delivered."""
+    return settings.DJANGO_EVENTS_BACKEND == "postgres"
+
+
+def _payloads(events):
+    """Pack events into JSON lists of at most ``MAX_PAYLOAD_BYTES`` (ASCII) each."""
+    batch, size = [], 2
+    for account_id, event, data in events:
+        message = json.dumps({"account_id": account_id, "event": event, "data": data})
+        if batch and size + len(message) + 1 > MAX_PAYLOAD_BYTES:
+            yield f"[{','.join(batch)}]"
+            batch, size = [], 2
+        batch.append(message)
+        size += len(message) + 1
+    if batch:
+        yield f"[{','.join(batch)}]"
+
+
+def publish_many(events):
+    """Publish ``(account_id, event, data)`` events, like ``publish()``."""
+    if cross_process():
+        payloads = list(_payloads(events))
+        if not payloads:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_notify(%s, payload) FROM unnest(%s::text[]) AS payload",
+                [CHANNEL, payloads],
+            )
+    else:
+        events = list(events)
+
+        def dispatch():
+            for event in events:
+                event_broker.dispatch(*event)
+
+        transaction.on_commit(dispatch)
+
+
+def publish(account_id, event, data):
+    """Publish an event for an account when the current transaction commits."""
+    publish_many([(account_id, event, data)])
+
+
+def _payment_request_event(payment_request):
+    data = {
+        "quote_id": payment_request.quote_id,
+        "request_type": payment_request.request_type,
+        "amount": payment_request.amount,
+        "status": payment_request.status,
+    }
+    return payment_request.account_id, PAYMENT_REQUEST, data
+
+
+def publish_balance(account_id, balance):
+    publish(account_id, BALANCE, {"balance": balance})
+
+
+def publish_balances(balances):
+    """Publish ``{account_id: balance}`` balance changes."""
+    publish_many(
+        (account_id, BALANCE, {"balance": balance})
+        for account_id, balance in balances.items()
+    )
+
+
+def publish_payment_request(payment_request):
+    publish_many([_payment_request_event(payment_request)])
+
+
+def publish_payment_requests(payment_requests):
+    publish_many(map(_payment_request_event, payment_requests))
+
+
+def _notifies(conn):
+    """Notifications received on a psycopg2 or psycopg 3 connection."""
+    if hasattr(conn, "poll"):
+        conn.poll()
+        while conn.notifies:
+            yield conn.notifies.pop(0)
+    else:
+        yield from conn.notifies(timeout=0)
+
+
+class EventBroker:
+    """Fans out events to the SSE connections of this process.
+
+    Subscriber queues live on the serving event loop; ``dispatch`` may be called
+    from any thread (e.g. a transaction committed in an ``in_db_thread`` pool thread).
+    """
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._loop = None
+        self._listener = None
+
+    @property
+    def started(self):
+        """Whether events are delivered in this process (only under ASGI)."""
+        return self._loop is not None
+
+    async def start(self):
+        if self._loop is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        if settings.DJANGO_EVENTS_BACKEND == "postgres":
+            self._listener = asyncio.create_task(self._listen_forever())
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+        self._listener = None
+        self._loop = None
+
+    @asynccontextmanager
+    async def subscribe(self, account_id):
+        """Yield a queue receiving ``(event, data)`` tuples for the account."""
+        queue = asyncio.Queue(maxsize=settings.DJANGO_EVENTS_QUEUE_SIZE)
+        self._subscribers[account_id].add(queue)
+        try:
+            yield queue
+        finally:
+            self._subscribers[account_id].discard(queue)
+            if not self._subscribers[account_id]:
+                del self._subscribers[account_id]
+
+    def dispatch(self, account_id, event, data):
+        if self._loop is None:
+            return  # Nobody can be subscribed in this process
+        self._loop.call_soon_threadsafe(self._deliver, account_id, event, data)
+
+    def _deliver(self, account_id, event, data):
+        for queue in self._subscribers.get(account_id, ()):
+            try:
+                queue.put_nowait((event, data))
+            except asyncio.QueueFull:
+                # Slow client, drop the event rather than buffer without bound
+                logger.warning("Dropped %s event for account %s", event, account_id)
+
+    def _connect_listener(self):
+        # Not from Django's connection handling (or pool): it stays in LISTEN
+        # for the life of the process
+        db = connections["default"]
+        params = db.get_connection_params()
+        if settings.DJANGO_EVENTS_LISTEN_HOST:
+            params["host"] = settings.DJANGO_EVENTS_LISTEN_HOST
+        if settings.DJANGO_EVENTS_LISTEN_PORT:
+            params["port"] = settings.DJANGO_EVENTS_LISTEN_PORT
+        conn = db.Database.connect(**params)
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute(f"LISTEN {CHANNEL}")
+        return conn
+
+    async def _listen_forever(self):
+        while True:
+            conn = None
+            try:
+                conn = await asyncio.to_thread(self._connect_listener)
+                readable = asyncio.Event()
+                self._loop.add_reader(conn.fileno(), readable.set)
+                try:
+                    while True:
+                        await readable.wait()
+                        readable.clear()
+                        for notify in _notifies(conn):
+                            for message in json.loads(notify.payload):
+                                self._deliver(
+                                    message["account_id"],
+                                    message["event"],
+                                    message["data"],
+                                )
+                finally:
+                    self._loop.remove_reader(conn.fileno())
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Event listener failed, reconnecting")
+                await asyncio.sleep(1)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+
+event_broker = EventBroker()
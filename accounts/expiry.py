@@ -0,0 +1,62 @@
+"""Bulk expiry of abandoned payment requests, run by ``expirepayments``.
+
+The settlement worker expires a deposit itself once the mint confirms it is
+unpaid. This sweeper catches everything else that was left pending, but
+only ``DJANGO_EXPIRY_GRACE_SECONDS`` after it expired, so the settlement worker
+gets to make its final check of a quote that might have been paid at the last
+moment. If the worker was down, it still checks deposits expired here until
+the mint's quote expires and credits any that were paid after all (see
+``accounts.settlement``). Overdue rows are found through a partial index
+on ``expires_at`` of pending rows and expired with one UPDATE per batch.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import events
+from .models import PaymentRequest
+
+Status = PaymentRequest.Status
+
+
+def expire_batch(cutoff, batch_size):
+    """Expire up to ``batch_size`` requests pending past ``cutoff``.
+
+    Returns how many.
+    """
+    with transaction.atomic():
+        # Rows being settled right now are locked, leave them to the settler
+        batch = list(
+            PaymentRequest.objects.select_for_update(skip_locked=True)
+            .filter(status=Status.PENDING, expires_at__lt=cutoff)
+            .order_by("expires_at")
+            .only("id", "account_id", "request_type", "amount", "quote_id", "status")[
+                :batch_size
+            ]
+        )
+        if not batch:
+            return 0
+        PaymentRequest.objects.filter(id__in=[pr.id for pr in batch]).update(
+            status=Status.EXPIRED
+        )
+        for payment_request in batch:
+            payment_request.status = Status.EXPIRED
+        events.publish_payment_requests(batch)
+    return len(batch)
+
+
+def expire_overdue(batch_size=None, grace=None):
+    """Expire every request pending past its grace period. Returns how many."""
+    batch_size = batch_size or settings.DJANGO_EXPIRY_BATCH_SIZE
+    if grace is None:
+        grace = settings.DJANGO_EXPIRY_GRACE_SECONDS
+    cutoff = timezone.now() - timedelta(seconds=grace)
+    expired = 0
+    while True:
+        count = expire_batch(cutoff, batch_size)
+        expired += count
+        if count < batch_size:
+            return expired
@@ -0,0 +1,211 @@
+"""Streaming CSV/NDJSON exports of the ledger, payment requests and balances.
+
+Rows are read through a server-side cursor (``iterator()``/``aiterator()`` on
+Postgres) and encoded, and optionally gzipped, one chunk at a time, so an
+export of any size holds at most one chunk of rows in memory. Where server-side
+cursors are disabled (``DJANGO_DATABASE_POOL=pgbouncer``), where ``iterator()``
+would fetch every row at once, they are read in keyset pages instead. Used by
+the ``exportdata`` command and the staff-only ``/accounts/export/`` endpoint.
+"""
+
+import csv
+import io
+import json
+import zlib
+from datetime import datetime, time
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import F, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import ArchivedPaymentRequest, LedgerEntry, PaymentRequest
+
+LEDGER = "ledger"
+PAYMENTS = "payments"
+ARCHIVED_PAYMENTS = "archived_payments"
+BALANCES = "balances"
+DATASETS = [LEDGER, PAYMENTS, ARCHIVED_PAYMENTS, BALANCES]
+
+CSV = "csv"
+NDJSON = "ndjson"
+FORMATS = [CSV, NDJSON]
+CONTENT_TYPES = {CSV: "text/csv", NDJSON: "application/x-ndjson"}
+
+FIELDS = {
+    LEDGER: ["id", "txn_id", "account_id", "amount", "kind", "reference", "created_at"],
+    PAYMENTS: [
+        "id",
+        "account_id",
+        "request_type",
+        "amount",
+        "quote_id",
+        "invoice",
+        "status",
+        "created_at",
+        "expires_at",
+        "paid_at",
+    ],
+    BALANCES: ["account_id", "username", "balance"],
+}
+FIELDS[ARCHIVED_PAYMENTS] = FIELDS[PAYMENTS] + ["archived_at"]
+
+# Rows per server-side cursor fetch and per encoded chunk
+CHUNK_SIZE = 5000
+
+
+def parse_bound(value):
+    """Parse a ``YYYY-MM-DD`` date (midnight) or ISO datetime, or None."""
+    if not value:
+        return None
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Invalid date: {value}")
+        moment = datetime.combine(day, time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def rows(dataset, since=None, until=None):
+    """Queryset of the dataset's rows as dicts, ``since <= created_at < until``.
+
+    ``balances`` are every account's balance as of ``until``, rebuilt from the
+    ledger; ``since`` does not apply to them.
+    """
+    if dataset == BALANCES:
+        entries = LedgerEntry.objects.all()
+        if until:
+            entries = entries.filter(created_at__lt=until)
+        return (
+            entries.values("account_id")
+            .annotate(username=F("account__username"), balance=Sum("amount"))
+            .values(*FIELDS[BALANCES])
+            .order_by("account_id")
+        )
+
+    if dataset == LEDGER:
+        queryset = LedgerEntry.objects.values(*FIELDS[LEDGER])
+    elif dataset == PAYMENTS:
+        queryset = PaymentRequest.objects.values(*FIELDS[PAYMENTS])
+    elif dataset == ARCHIVED_PAYMENTS:
+        queryset = ArchivedPaymentRequest.objects.values(*FIELDS[ARCHIVED_PAYMENTS])
+    else:
+        raise ValueError(f"Unknown dataset: {dataset}")
+    if since:
+        queryset = queryset.filter(created_at__gte=since)
+    if until:
+        queryset = queryset.filter(created_at__lt=until)
+    return queryset.order_by("id")
+
+
+class Encoder:
+    """Encodes chunks of a dataset's row dicts to bytes, gzipped if asked to."""
+
+    def __init__(self, dataset, export_format, compress=False):
+        if export_format not in FORMATS:
+            raise ValueError(f"Unknown format: {export_format}")
+        self.fields = FIELDS[dataset]
+        self.format = export_format
+        self._header_written = False
+        # wbits=31 writes a gzip header and trailer
+        self._compressor = zlib.compressobj(wbits=31) if compress else None
+
+    def encode(self, chunk):
+        if self.format == NDJSON:
+            data = "".join(
+                json.dumps(row, cls=DjangoJSONEncoder) + "\n" for row in chunk
+            )
+        else:
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            if not self._header_written:
+                writer.writerow(self.fields)
+                self._header_written = True
+            writer.writerows([row[field] for field in self.fields] for row in chunk)
+            data = buffer.getvalue()
+        data = data.encode()
+        if self._compressor is not None:
+            data = self._compressor.compress(data)
+        return data
+
+    def finish(self):
+        if self._compressor is not None:
+            return self._compressor.flush()
+        return b""
+
+
+def _server_side_cursors(queryset):
+    return not connections[queryset.db].settings_dict.get("DISABLE_SERVER_SIDE_CURSORS")
+
+
+def _next_page(queryset, page):
+    # Querysets here are ordered by a unique key, their first field
+    key = queryset.query.order_by[0]
+    return queryset.filter(**{f"{key}__gt": page[-1][key]})[:CHUNK_SIZE]
+
+
+def chunks(queryset):
+    """Yield lists of up to ``CHUNK_SIZE`` rows of a queryset of dicts.
+
+    The last list is shorter, possibly empty. The queryset must be ordered by a
+    unique field that it selects.
+    """
+    if not _server_side_cursors(queryset):
+        page = list(queryset[:CHUNK_SIZE])
+        while len(page) == CHUNK_SIZE:
+            yield page
+            page = list(_next_page(queryset, page))
+        yield page
+        return
+    chunk = []
+    for row in queryset.iterator(chunk_size=CHUNK_SIZE):
+        chunk.append(row)
+        if len(chunk) >= CHUNK_SIZE:
+            yield chunk
+            chunk = []
+    yield chunk
+
+
+async def achunks(queryset):
+    """Async ``chunks()``."""
+    if not _server_side_cursors(queryset):
+        page = [row async for row in queryset[:CHUNK_SIZE]]
+        while len(page) == CHUNK_SIZE:
+            yield page
+            page = [row async for row in _next_page(queryset, page)]
+        yield page
+        return
+    chunk = []
+    async for row in queryset.aiterator(chunk_size=CHUNK_SIZE):
+        chunk.append(row)
+        if len(chunk) >= CHUNK_SIZE:
+            yield chunk
+            chunk = []
+    yield chunk
+
+
+def iter_export(queryset, encoder):
+    """Yield the encoded export of ``queryset`` chunk by chunk."""
+    for chunk in chunks(queryset):
+        yield encoder.encode(chunk)
+    yield encoder.finish()
+
+
+async def aiter_export(queryset, encoder):
+    """Async ``iter_export()``, for streaming responses under ASGI."""
+    async for chunk in achunks(queryset):
+        yield encoder.encode(chunk)
+    yield encoder.finish()
+
+
+def filename(dataset, export_format, since=None, until=None, compress=False):
+    parts = [dataset]
+    if since:
+        parts.append(since.date().isoformat())
+    if until:
+        parts.append(until.date().isoformat())
+    return "-".join(parts) + f".{export_format}" + (".gz" if compress else "")
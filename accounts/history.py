@@ -0,0 +1,95 @@
+"""Keyset-paginated account history for ``/accounts/history/``.
+
+Pages are ordered newest first by ``(created_at, id)`` and the cursor is the
+last row's key, so fetching any page is one index range scan on
+``(account, created_at, id)`` no matter how deep it is. Both sources have a
+covering index for these scans, and one per filter (``kind``, ``status``,
+``request_type``) on ``(account, <filter>, created_at, id)``, so filtered pages
+don't walk the account's other rows.
+"""
+
+import base64
+import json
+from datetime import datetime
+
+from django.db.models import Q
+
+from .models import ArchivedPaymentRequest, LedgerEntry, PaymentRequest
+
+LEDGER = "ledger"
+PAYMENTS = "payments"
+ARCHIVED_PAYMENTS = "archived_payments"
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+LEDGER_FIELDS = ["id", "txn_id", "amount", "kind", "reference", "created_at"]
+PAYMENT_FIELDS = [
+    "id",
+    "request_type",
+    "amount",
+    "status",
+    "quote_id",
+    "created_at",
+    "expires_at",
+    "paid_at",
+]
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(row):
+    key = [row["created_at"].isoformat(), row["id"]]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor("Invalid cursor") from e
+
+
+def _page(rows, cursor, limit):
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        # The redundant created_at <= bound is where the index range scan starts
+        rows = rows.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=row_id),
+            created_at__lte=created_at,
+        )
+    page = list(rows.order_by("-created_at", "-id")[: limit + 1])
+    next_cursor = encode_cursor(page[limit - 1]) if len(page) > limit else None
+    return page[:limit], next_cursor
+
+
+def ledger_page(account_id, kind=None, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """Return ``(entries, next_cursor)`` of an account's ledger entries."""
+    rows = LedgerEntry.objects.filter(account_id=account_id)
+    if kind:
+        rows = rows.filter(kind=kind)
+    return _page(rows.values(*LEDGER_FIELDS), cursor, limit)
+
+
+def payments_page(
+    account_id,
+    request_type=None,
+    status=None,
+    cursor=None,
+    limit=DEFAULT_PAGE_SIZE,
+    archived=False,
+):
+    """Return ``(payment_requests, next_cursor)`` of an account's invoices.
+
+    With ``archived`` the archived requests (see ``accounts.archive``) are paged.
+    """
+    model = ArchivedPaymentRequest if archived else PaymentRequest
+    rows = model.objects.filter(account_id=account_id)
+    if request_type:
+        rows = rows.filter(request_type=request_type)
+    if status:
+        rows = rows.filter(status=status)
+    return _page(rows.values(*PAYMENT_FIELDS), cursor, limit)
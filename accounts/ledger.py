@@ -0,0 +1,175 @@
+"""Append-only ledger of every balance change.
+
+``transfers.apply_balance_changes()`` writes one journal per transaction: an
+entry for every account whose balance changed, sharing a ``txn_id``, inserted
+with one multi-row INSERT in the same transaction as the balance changes.
+Deposits and withdrawals move the bank account together with the user's, so
+the sum of an account's entries is always its balance (for the bank account
+including changes not folded into its row yet, see ``accounts.aggregates``).
+
+The ledger is double-entry: what a transaction's entries don't net out (money
+that came from or went to the mint and Lightning) is balanced by an entry for
+the outside world, which has no account. Every ``txn_id`` sums to zero, which
+``unbalanced()`` checks.
+"""
+
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import aggregates
+from .models import Account, AccountAggregate, LedgerEntry
+
+Kind = LedgerEntry.Kind
+
+INSERT_BATCH_SIZE = 1000
+
+_bank_account_id = None
+
+
+class Journal:
+    """Buffers the entries of one transaction and inserts them together."""
+
+    def __init__(self, kind, reference=""):
+        self.txn_id = uuid.uuid4()
+        self.kind = kind
+        self.reference = reference
+        self.created_at = timezone.now()
+        self.entries = []
+
+    def add(self, account_id, amount):
+        if amount:
+            self.entries.append(
+                LedgerEntry(
+                    txn_id=self.txn_id,
+                    account_id=account_id,
+                    amount=amount,
+                    kind=self.kind,
+                    reference=self.reference,
+                    created_at=self.created_at,
+                )
+            )
+
+    def add_bank(self, amount):
+        bank_id = bank_account_id()
+        if bank_id is not None:
+            self.add(bank_id, amount)
+
+    def flush(self):
+        # The outside world's side of whatever the accounts' entries don't net out
+        self.add(None, -sum(entry.amount for entry in self.entries))
+        LedgerEntry.objects.bulk_create(self.entries, batch_size=INSERT_BATCH_SIZE)
+        self.entries = []
+
+
+@contextmanager
+def journal(kind, reference=""):
+    """Yield a ``Journal`` that is written when the block exits normally.
+
+    Must be used inside the transaction that makes the balance changes.
+    """
+    entries = Journal(kind, reference)
+    yield entries
+    entries.flush()
+
+
+def bank_account_id():
+    global _bank_account_id
+    if _bank_account_id is not None:
+        return _bank_account_id
+    bank_id = (
+        Account.objects.filter(username=settings.DJANGO_BANK_WALLET)
+        .values_list("id", flat=True)
+        .first()
+    )
+    # Until the bank account exists every call looks it up again
+    if bank_id is not None:
+        _bank_account_id = bank_id
+    return bank_id
+
+
+def balance(account_id, until=None):
+    """Rebuild an account's balance from the ledger, optionally as of ``until``."""
+    entries = LedgerEntry.objects.filter(account_id=account_id)
+    if until is not None:
+        entries = entries.filter(created_at__lte=until)
+    return entries.aggregate(total=Sum("amount"))["total"] or 0
+
+
+def _ledger_totals():
+    return Coalesce(
+        Subquery(
+            LedgerEntry.objects.filter(account=OuterRef("pk"))
+            .order_by()
+            .values("account")
+            .annotate(total=Sum("amount"))
+            .values("total")
+        ),
+        Value(0),
+    )
+
+
+def _drift(accounts):
+    """``{account_id: (ledger, balance)}`` for accounts whose ledger disagrees."""
+    bank_id = bank_account_id()
+    drift = {}
+    rows = accounts.annotate(ledger=_ledger_totals()).values_list(
+        "id", "ledger", "balance"
+    )
+    for account_id, ledger_total, account_balance in rows.iterator():
+        if account_id == bank_id:
+            account_balance = aggregates.bank_balance()
+        if ledger_total != account_balance:
+            drift[account_id] = (ledger_total, account_balance)
+    return drift
+
+
+def verify():
+    """Return ``{account_id: (ledger, balance)}`` for every account that drifted."""
+    return _drift(Account.objects.order_by("id"))
+
+
+def unbalanced():
+    """``{txn_id: total}`` of every transaction whose entries don't sum to zero."""
+    return dict(
+        LedgerEntry.objects.order_by()
+        .values("txn_id")
+        .annotate(total=Sum("amount"))
+        .exclude(total=0)
+        .values_list("txn_id", "total")
+    )
+
+
+def adjust():
+    """Append adjustment entries so the ledger matches every balance again.
+
+    For balances changed outside ``accounts.transfers`` (e.g. in the admin).
+    Returns the adjustments made as ``{account_id: amount}``.
+    """
+    candidates = list(verify())
+    if not candidates:
+        return {}
+    with transaction.atomic():
+        # Lock like transfers do: account rows, then the bank's pending shards
+        accounts = Account.objects.select_for_update().filter(id__in=candidates)
+        list(accounts.order_by("id").values_list("id", flat=True))
+        list(
+            AccountAggregate.objects.select_for_update()
+            .filter(name=AccountAggregate.Name.BANK_PENDING)
+            .order_by("shard")
+        )
+        adjustments = {
+            account_id: account_balance - ledger_total
+            for account_id, (ledger_total, account_balance) in _drift(
+                accounts.order_by("id")
+            ).items()
+        }
+        with journal(Kind.ADJUSTMENT, reference="checkledger") as entries:
+            for account_id, amount in adjustments.items():
+                entries.add(account_id, amount)
+    return adjustments
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from accounts import archive
+
+
+class Command(BaseCommand):
+    help = "Moves old paid, expired and failed payment requests to the archive table"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than",
+            type=float,
+            metavar="DAYS",
+            help="Archive requests created more than DAYS ago",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, help="Requests moved per transaction"
+        )
+
+    def handle(self, *args, **options):
+        archived = archive.archive_old(
+            days=options["older_than"], batch_size=options["batch_size"]
+        )
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} payment requests"))
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts import ledger
+
+
+class Command(BaseCommand):
+    help = (
+        "Checks that the ledger adds up to every account's balance and that "
+        "every transaction's entries sum to zero"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--adjust",
+            action="store_true",
+            help="Append adjustment entries for balances the ledger disagrees with",
+        )
+
+    def handle(self, *args, **options):
+        if options["adjust"]:
+            adjustments = ledger.adjust()
+            for account_id, amount in adjustments.items():
+                self.stdout.write(f"account {account_id}: adjusted by {amount:+}")
+            self.stdout.write(
+                self.style.SUCCESS(f"{len(adjustments)} accounts adjusted")
+            )
+            return
+
+        unbalanced = ledger.unbalanced()
+        for txn_id, total in unbalanced.items():
+            self.stderr.write(f"transaction {txn_id}: entries sum to {total}")
+        if unbalanced:
+            raise CommandError("Ledger transactions do not balance")
+
+        drift = ledger.verify()
+        if drift:
+            for account_id, (ledger_total, balance) in drift.items():
+                self.stderr.write(
+                    f"account {account_id}: ledger {ledger_total}, balance {balance}"
+                )
+            raise CommandError(
+                "Ledger does not match balances, see checkledger --adjust"
+            )
+        self.stdout.write(self.style.SUCCESS("Ledger matches all balances"))
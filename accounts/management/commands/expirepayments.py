@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts import expiry
+
+
+class Command(BaseCommand):
+    help = "Expires payment requests left pending past their expiry"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, help="Requests expired per UPDATE"
+        )
+        parser.add_argument(
+            "--grace",
+            type=float,
+            help="Seconds after expiry before a request is swept",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            help="Keep running and sweep every INTERVAL seconds",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            expired = expiry.expire_overdue(
+                batch_size=options["batch_size"], grace=options["grace"]
+            )
+            if expired or not options["interval"]:
+                self.stdout.write(f"Expired {expired} payment requests")
+            if not options["interval"]:
+                return
+            time.sleep(options["interval"])
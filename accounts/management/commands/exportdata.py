@@ -0,0 +1,47 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts import exports
+from accounts.routers import use_replicas
+
+
+class Command(BaseCommand):
+    help = "Streams the ledger, payment requests or balances as CSV or NDJSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument("dataset", choices=exports.DATASETS)
+        parser.add_argument("--format", choices=exports.FORMATS, default=exports.CSV)
+        parser.add_argument(
+            "--since", help="Include rows created at or after this date/datetime"
+        )
+        parser.add_argument(
+            "--until",
+            help="Include rows created before this date/datetime "
+            "(for balances: the balances as of then)",
+        )
+        parser.add_argument("--gzip", action="store_true", help="Compress the output")
+        parser.add_argument("--output", help="File to write instead of stdout")
+
+    def handle(self, *args, **options):
+        try:
+            since = exports.parse_bound(options["since"])
+            until = exports.parse_bound(options["until"])
+        except ValueError as e:
+            raise CommandError(e)
+
+        queryset = exports.rows(options["dataset"], since, until)
+        encoder = exports.Encoder(
+            options["dataset"], options["format"], compress=options["gzip"]
+        )
+        output = open(options["output"], "wb") if options["output"] else None
+        try:
+            stream = output or sys.stdout.buffer
+            # A long read, keep it off the primary
+            with use_replicas():
+                for data in exports.iter_export(queryset, encoder):
+                    stream.write(data)
+            stream.flush()
+        finally:
+            if output:
+                output.close()
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts import aggregates
+
+
+class Command(BaseCommand):
+    help = "Folds pending changes to the bank account's balance into its row"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=float,
+            help="Keep running and fold every INTERVAL seconds",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            folded = aggregates.fold_bank_balance()
+            if folded or not options["interval"]:
+                self.stdout.write(f"Folded {folded} into the bank balance")
+            if not options["interval"]:
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts import aggregates
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuilds the account totals behind the stats endpoint from the accounts table"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verify",
+            action="store_true",
+            help="Only compare the stored totals with the accounts table",
+        )
+
+    def handle(self, *args, **options):
+        if options["verify"]:
+            drift = aggregates.verify()
+            if drift:
+                for name, (stored, actual) in drift.items():
+                    self.stderr.write(f"{name}: stored {stored}, actual {actual}")
+                raise CommandError("Aggregates are out of date, run rebuildaggregates")
+            self.stdout.write(self.style.SUCCESS("Aggregates are up to date"))
+            return
+
+        totals = aggregates.rebuild()
+        for name, value in totals.items():
+            self.stdout.write(f"{name}: {value}")
+        self.stdout.write(self.style.SUCCESS("Aggregates rebuilt"))
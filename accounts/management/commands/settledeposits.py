@@ -0,0 +1,39 @@
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+from accounts.settlement import DepositSettler
+from accounts.wallet import wallet_manager
+
+
+class Command(BaseCommand):
+    help = "Runs the worker that credits paid deposit invoices and expires stale ones"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once", action="store_true", help="Run a single settlement pass"
+        )
+        parser.add_argument(
+            "--batch-size", type=int, help="Quotes checked concurrently per batch"
+        )
+        parser.add_argument(
+            "--interval", type=float, help="Seconds between settlement passes"
+        )
+
+    def handle(self, *args, **options):
+        settler = DepositSettler(
+            batch_size=options["batch_size"], interval=options["interval"]
+        )
+        asyncio.run(self._run(settler, options["once"]))
+
+    async def _run(self, settler, once):
+        await wallet_manager.start()
+        try:
+            if once:
+                counts = await settler.settle_once()
+                self.stdout.write(self.style.SUCCESS(f"Settlement pass: {counts}"))
+            else:
+                self.stdout.write("Settling deposits, press Ctrl+C to stop")
+                await settler.run()
+        finally:
+            await wallet_manager.stop()
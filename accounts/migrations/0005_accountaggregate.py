@@ -0,0 +1,79 @@
+# Generated by Django 6.0 on 2026-10-17 02:58
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def populate_aggregates(apps, schema_editor):
+    Account = apps.get_model("accounts", "Account")
+    AccountAggregate = apps.get_model("accounts", "AccountAggregate")
+
+    def total_balance(accounts):
+        return accounts.aggregate(total=Sum("balance"))["total"] or 0
+
+    # Remaining shards are created on first use
+    AccountAggregate.objects.bulk_create(
+        [
+            AccountAggregate(
+                name="accounts",
+                shard=0,
+                value=Account.objects.filter(is_superuser=False).count(),
+            ),
+            AccountAggregate(
+                name="assets",
+                shard=0,
+                value=total_balance(Account.objects.filter(is_staff=True)),
+            ),
+            AccountAggregate(
+                name="liabilities",
+                shard=0,
+                value=total_balance(Account.objects.filter(is_staff=False)),
+            ),
+        ]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0004_paymentrequest"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AccountAggregate",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "name",
+                    models.CharField(
+                        choices=[
+                            ("accounts", "Accounts"),
+                            ("assets", "Assets"),
+                            ("liabilities", "Liabilities"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("shard", models.PositiveSmallIntegerField()),
+                ("value", models.BigIntegerField(default=0)),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("name", "shard"),
+                        name="accounts_aggregate_name_shard_uniq",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(populate_aggregates, migrations.RunPython.noop),
+    ]
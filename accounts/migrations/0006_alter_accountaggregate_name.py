@@ -0,0 +1,26 @@
+# Generated by Django 6.0 on 2026-10-17 03:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0005_accountaggregate"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="accountaggregate",
+            name="name",
+            field=models.CharField(
+                choices=[
+                    ("accounts", "Accounts"),
+                    ("assets", "Assets"),
+                    ("bank_pending", "Bank pending"),
+                    ("liabilities", "Liabilities"),
+                ],
+                max_length=20,
+            ),
+        ),
+    ]
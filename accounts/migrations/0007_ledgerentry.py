@@ -0,0 +1,114 @@
+# Generated by Django 6.0 on 2026-10-17 03:04
+
+import uuid
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+from django.utils import timezone
+
+
+def write_opening_entries(apps, schema_editor):
+    Account = apps.get_model("accounts", "Account")
+    AccountAggregate = apps.get_model("accounts", "AccountAggregate")
+    LedgerEntry = apps.get_model("accounts", "LedgerEntry")
+
+    # The bank's balance includes changes not folded into its row yet
+    bank_pending = (
+        AccountAggregate.objects.filter(name="bank_pending").aggregate(
+            total=Sum("value")
+        )["total"]
+        or 0
+    )
+    txn_id = uuid.uuid4()
+    now = timezone.now()
+    entries = []
+    for account_id, username, balance in Account.objects.values_list(
+        "id", "username", "balance"
+    ).iterator():
+        if username == settings.DJANGO_BANK_WALLET:
+            balance += bank_pending
+        if balance:
+            entries.append(
+                LedgerEntry(
+                    txn_id=txn_id,
+                    account_id=account_id,
+                    amount=balance,
+                    kind="opening",
+                    created_at=now,
+                )
+            )
+    LedgerEntry.objects.bulk_create(entries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0006_alter_accountaggregate_name"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LedgerEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("txn_id", models.UUIDField()),
+                (
+                    "amount",
+                    models.BigIntegerField(help_text="Signed change of the balance"),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("opening", "Opening balance"),
+                            ("transfer", "Transfer"),
+                            ("deposit", "Deposit"),
+                            ("redeem", "Redeem"),
+                            ("withdraw", "Withdraw"),
+                            ("lightning", "Lightning payment"),
+                            ("adjustment", "Adjustment"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "reference",
+                    models.CharField(
+                        blank=True,
+                        help_text="E.g. the quote ID of a deposit",
+                        max_length=255,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "account",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="ledger_entries",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["account", "created_at"],
+                        name="accounts_ledger_account_time",
+                    ),
+                    models.Index(fields=["txn_id"], name="accounts_ledger_txn"),
+                ],
+            },
+        ),
+        migrations.RunPython(write_opening_entries, migrations.RunPython.noop),
+    ]
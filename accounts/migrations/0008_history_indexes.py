@@ -0,0 +1,40 @@
+# Generated by Django 6.0 on 2026-10-17 03:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0007_ledgerentry"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="ledgerentry",
+            name="accounts_ledger_account_time",
+        ),
+        migrations.AddIndex(
+            model_name="ledgerentry",
+            index=models.Index(
+                fields=["account", "-created_at", "-id"],
+                include=("txn_id", "amount", "kind", "reference"),
+                name="accounts_ledger_history",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="paymentrequest",
+            index=models.Index(
+                fields=["account", "-created_at", "-id"],
+                include=(
+                    "request_type",
+                    "amount",
+                    "status",
+                    "quote_id",
+                    "expires_at",
+                    "paid_at",
+                ),
+                name="accounts_payreq_history",
+            ),
+        ),
+    ]
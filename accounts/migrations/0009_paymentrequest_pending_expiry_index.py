@@ -0,0 +1,21 @@
+# Generated by Django 6.0 on 2026-10-17 03:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0008_history_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="paymentrequest",
+            index=models.Index(
+                condition=models.Q(("status", "pending")),
+                fields=["expires_at"],
+                name="accounts_payreq_pending_exp",
+            ),
+        ),
+    ]
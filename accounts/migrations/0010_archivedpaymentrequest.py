@@ -0,0 +1,73 @@
+# Generated by Django 6.0 on 2026-10-17 03:09
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0009_paymentrequest_pending_expiry_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedPaymentRequest",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                (
+                    "request_type",
+                    models.CharField(
+                        choices=[("deposit", "Deposit"), ("withdraw", "Withdraw")],
+                        max_length=10,
+                    ),
+                ),
+                ("amount", models.BigIntegerField(help_text="Amount in sats")),
+                (
+                    "quote_id",
+                    models.CharField(
+                        help_text="Cashu mint/melt quote ID", max_length=255
+                    ),
+                ),
+                ("invoice", models.TextField(help_text="Lightning invoice (bolt11)")),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("paid", "Paid"),
+                            ("expired", "Expired"),
+                            ("failed", "Failed"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("created_at", models.DateTimeField()),
+                ("expires_at", models.DateTimeField()),
+                ("paid_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "archived_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                (
+                    "account",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_payment_requests",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["quote_id"], name="accounts_archpay_quote"),
+                    models.Index(
+                        fields=["account", "-created_at", "-id"],
+                        name="accounts_archpay_history",
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 6.0 on 2026-10-17 03:15
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0010_archivedpaymentrequest"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SpentProof",
+            fields=[
+                (
+                    "y",
+                    models.CharField(max_length=66, primary_key=True, serialize=False),
+                ),
+                ("spent_at", models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
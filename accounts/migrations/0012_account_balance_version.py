@@ -0,0 +1,20 @@
+# Generated by Django 6.0 on 2026-10-17 03:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0011_spentproof"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="account",
+            name="balance_version",
+            field=models.BigIntegerField(
+                default=0, help_text="Incremented with every balance change"
+            ),
+        ),
+    ]
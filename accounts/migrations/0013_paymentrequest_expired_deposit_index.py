@@ -0,0 +1,21 @@
+# Generated by Django 6.0 on 2026-10-17 03:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0012_account_balance_version"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="paymentrequest",
+            index=models.Index(
+                condition=models.Q(("request_type", "deposit"), ("status", "expired")),
+                fields=["expires_at"],
+                name="accounts_payreq_expired_dep",
+            ),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 6.0 on 2026-10-17 03:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0013_paymentrequest_expired_deposit_index"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="ledgerentry",
+            index=models.Index(
+                fields=["account", "kind", "-created_at", "-id"],
+                name="accounts_ledger_kind_hist",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="paymentrequest",
+            index=models.Index(
+                fields=["account", "status", "-created_at", "-id"],
+                name="accounts_payreq_status_hist",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="paymentrequest",
+            index=models.Index(
+                fields=["account", "request_type", "-created_at", "-id"],
+                name="accounts_payreq_type_hist",
+            ),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 6.0 on 2026-10-17 03:46
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def balance_transactions(apps, schema_editor):
+    LedgerEntry = apps.get_model("accounts", "LedgerEntry")
+    # Deposits, withdrawals and the opening balances written before entries
+    # for the outside world were
+    unbalanced = (
+        LedgerEntry.objects.order_by()
+        .values("txn_id", "kind", "reference")
+        .annotate(total=Sum("amount"), created_at=models.Max("created_at"))
+        .exclude(total=0)
+    )
+    LedgerEntry.objects.bulk_create(
+        (
+            LedgerEntry(
+                txn_id=txn["txn_id"],
+                account_id=None,
+                amount=-txn["total"],
+                kind=txn["kind"],
+                reference=txn["reference"],
+                created_at=txn["created_at"],
+            )
+            for txn in unbalanced.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0014_history_filter_indexes"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="ledgerentry",
+            name="account",
+            field=models.ForeignKey(
+                blank=True,
+                help_text="Empty for the outside world (the mint, Lightning)",
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="ledger_entries",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.RunPython(balance_transactions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,86 @@
+"""On-disk cache of mint info and keysets, kept next to the bank's cashu wallet.
+
+New workers read it to start serving without a round trip to the mint. Entries
+are trusted for ``DJANGO_MINT_CACHE_TTL_SECONDS`` and tied to ``DJANGO_MINT_URL``.
+"""
+
+import json
+import os
+import tempfile
+import time
+
+from django.conf import settings
+
+
+def _path(name):
+    return os.path.join(
+        settings.DJANGO_BANK_WALLET_CASHU_DIR,
+        f"{settings.DJANGO_BANK_WALLET}.{name}.json",
+    )
+
+
+def _read(name):
+    """Return the cached entry if it is for the configured mint and not expired."""
+    try:
+        with open(_path(name)) as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if entry.get("mint_url") != settings.DJANGO_MINT_URL:
+        return None
+    if (
+        time.time() - entry.get("fetched_at", 0)
+        > settings.DJANGO_MINT_CACHE_TTL_SECONDS
+    ):
+        return None
+    return entry
+
+
+def _write(name, **data):
+    """Atomically replace the cached entry so concurrent workers never read half a file."""
+    path = _path(name)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    entry = {"mint_url": settings.DJANGO_MINT_URL, "fetched_at": time.time(), **data}
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def get_keysets():
+    """Cached keyset metadata: ``{"active_keyset_id": ..., "keysets": {id: {...}}}``."""
+    return _read("keysets")
+
+
+def store_keysets(wallet):
+    """Record the wallet's keysets and active keyset after a check against the mint.
+
+    The keys themselves live in the wallet DB; only what is needed to pick the
+    active keyset without asking the mint is cached here.
+    """
+    _write(
+        "keysets",
+        active_keyset_id=wallet.keyset_id,
+        keysets={
+            keyset.id: {
+                "unit": keyset.unit.name,
+                "active": keyset.active,
+                "input_fee_ppk": keyset.input_fee_ppk,
+            }
+            for keyset in wallet.keysets.values()
+        },
+    )
+
+
+def get_info():
+    """Cached ``/v1/info`` response as ``{"info": ..., "fetched_at": ...}``, or None."""
+    return _read("info")
+
+
+def store_info(info):
+    _write("info", info=info)
@@ -0,0 +1,102 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+
+import httpx
+from django.conf import settings
+
+from . import mint_cache
+
+logger = logging.getLogger(__name__)
+
+
+class MintClient:
+    """Keep-alive HTTP client for mint endpoints the cashu wallet doesn't cover.
+
+    Like the shared wallet, the client is opened on the serving event loop at
+    ASGI startup; callers on other loops get a short-lived client. Mint info is
+    cached in memory for ``DJANGO_MINT_INFO_TTL_SECONDS`` and served stale while
+    a single background request refreshes it.
+    """
+
+    def __init__(self):
+        self.client = None
+        self._loop = None
+        self._info = None
+        self._info_fetched_at = 0.0
+        self._info_refresh = None
+
+    def _new_client(self):
+        return httpx.AsyncClient(
+            base_url=settings.DJANGO_MINT_URL,
+            timeout=settings.DJANGO_MINT_HTTP_TIMEOUT_SECONDS,
+        )
+
+    async def start(self):
+        if self.client is None:
+            self.client = self._new_client()
+            self._loop = asyncio.get_running_loop()
+
+    async def stop(self):
+        if self._info_refresh is not None:
+            self._info_refresh.cancel()
+            self._info_refresh = None
+        if self.client is not None:
+            await self.client.aclose()
+        self.client = None
+        self._loop = None
+
+    @asynccontextmanager
+    async def session(self):
+        """Yield the shared client, or a temporary one off the serving loop."""
+        if self.client is None or asyncio.get_running_loop() is not self._loop:
+            async with self._new_client() as client:
+                yield client
+            return
+        yield self.client
+
+    async def fetch_info(self):
+        """Fetch ``/v1/info`` from the mint and update both caches."""
+        async with self.session() as client:
+            response = await client.get("/v1/info")
+            response.raise_for_status()
+            info = response.json()
+
+        self._info = info
+        self._info_fetched_at = time.time()
+        mint_cache.store_info(info)
+        return info
+
+    async def _refresh_info(self):
+        try:
+            await self.fetch_info()
+        except Exception:
+            logger.exception("Could not refresh mint info")
+        finally:
+            self._info_refresh = None
+
+    async def get_info(self):
+        """Mint info, fetched from the mint only when nothing is cached yet."""
+        if self._info is None:
+            entry = mint_cache.get_info()
+            if entry:
+                self._info = entry["info"]
+                self._info_fetched_at = entry["fetched_at"]
+
+        if self._info is None:
+            return await self.fetch_info()
+
+        stale = (
+            time.time() - self._info_fetched_at > settings.DJANGO_MINT_INFO_TTL_SECONDS
+        )
+        if stale and self._info_refresh is None:
+            if asyncio.get_running_loop() is self._loop:
+                self._info_refresh = asyncio.create_task(self._refresh_info())
+            else:
+                # No long-lived loop to refresh on, refresh inline
+                await self._refresh_info()
+        return self._info
+
+
+mint_client = MintClient()
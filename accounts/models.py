@@ -38,6 +38,40 @@ class PaymentRequest(models.Model):
         indexes = [
             models.Index(fields=["quote_id"]),
             models.Index(fields=["account", "status"]),
+            # Only live rows, for the expiry sweeper and the settlement worker
+            models.Index(
+                fields=["expires_at"],
+                condition=models.Q(status="pending"),
+                name="accounts_payreq_pending_exp",
+            ),
+            # For the settlement worker's recheck of swept deposits
+            models.Index(
+                fields=["expires_at"],
+                condition=models.Q(status="expired", request_type="deposit"),
+                name="accounts_payreq_expired_dep",
+            ),
+            # Covers the keyset scans of /accounts/history/ (Postgres only)
+            models.Index(
+                fields=["account", "-created_at", "-id"],
+                include=[
+                    "request_type",
+                    "amount",
+                    "status",
+                    "quote_id",
+                    "expires_at",
+                    "paid_at",
+                ],
+                name="accounts_payreq_history",
+            ),
+            # For history pages filtered by status or type
+            models.Index(
+                fields=["account", "status", "-created_at", "-id"],
+                name="accounts_payreq_status_hist",
+            ),
+            models.Index(
+                fields=["account", "request_type", "-created_at", "-id"],
+                name="accounts_payreq_type_hist",
+            ),
         ]
 
     def __str__(self):
@@ -53,21 +87,182 @@ class PaymentRequest(models.Model):
             self.save(update_fields=["status"])
 
     def mark_paid(self):
-        if self.status == self.Status.PENDING:
+        # An expired invoice may have been paid before it was swept
+        if self.status in (self.Status.PENDING, self.Status.EXPIRED):
             self.status = self.Status.PAID
             self.paid_at = timezone.now()
             self.save(update_fields=["status", "paid_at"])
 
 
+class ArchivedPaymentRequest(models.Model):
+    """Settled payment requests moved out of ``PaymentRequest`` by ``archivepayments``.
+
+    Rows keep their columns and ids, see ``accounts.archive``.
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    account = models.ForeignKey(
+        "Account", on_delete=models.CASCADE, related_name="archived_payment_requests"
+    )
+    request_type = models.CharField(
+        max_length=10, choices=PaymentRequest.RequestType.choices
+    )
+    amount = models.BigIntegerField(help_text="Amount in sats")
+    quote_id = models.CharField(max_length=255, help_text="Cashu mint/melt quote ID")
+    invoice = models.TextField(help_text="Lightning invoice (bolt11)")
+    status = models.CharField(max_length=10, choices=PaymentRequest.Status.choices)
+    created_at = models.DateTimeField()
+    expires_at = models.DateTimeField()
+    paid_at = models.DateTimeField(null=True, blank=True)
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["quote_id"], name="accounts_archpay_quote"),
+            models.Index(
+                fields=["account", "-created_at", "-id"],
+                name="accounts_archpay_history",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.request_type} {self.amount} sats - {self.status} (archived)"
+
+
+class SpentProof(models.Model):
+    """Y (``hash_to_curve(secret)``) of a proof known to be spent at the mint.
+
+    Filled from the bank wallet's swaps and the mint's NUT-07 state checks, so
+    replayed tokens are rejected without a mint call, see ``accounts.spent_proofs``.
+    """
+
+    y = models.CharField(max_length=66, primary_key=True)
+    spent_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return self.y
+
+
+class AccountAggregate(models.Model):
+    """Running totals over all accounts, split into shards to spread row locks.
+
+    Each total is the sum of its shard rows. Writers add to a random shard in the
+    same transaction that changes balances, see ``accounts.aggregates``.
+    ``bank_pending`` holds changes to the bank account's balance that have not
+    been folded into its row yet.
+    """
+
+    class Name(models.TextChoices):
+        ACCOUNTS = "accounts", "Accounts"
+        ASSETS = "assets", "Assets"
+        BANK_PENDING = "bank_pending", "Bank pending"
+        LIABILITIES = "liabilities", "Liabilities"
+
+    name = models.CharField(max_length=20, choices=Name.choices)
+    shard = models.PositiveSmallIntegerField()
+    value = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["name", "shard"], name="accounts_aggregate_name_shard_uniq"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name}[{self.shard}] = {self.value}"
+
+
+class LedgerEntry(models.Model):
+    """One balance change of one account. Rows are only ever inserted.
+
+    Entries of the same transaction share a ``txn_id`` and sum to zero: money
+    entering or leaving the bank (deposits, withdrawals) is balanced by an entry
+    without an account, for the outside world. The sum of an account's entries
+    is its balance. Written by ``accounts.ledger``.
+    """
+
+    class Kind(models.TextChoices):
+        OPENING = "opening", "Opening balance"
+        TRANSFER = "transfer", "Transfer"
+        DEPOSIT = "deposit", "Deposit"
+        REDEEM = "redeem", "Redeem"
+        WITHDRAW = "withdraw", "Withdraw"
+        LIGHTNING = "lightning", "Lightning payment"
+        ADJUSTMENT = "adjustment", "Adjustment"
+
+    txn_id = models.UUIDField()
+    account = models.ForeignKey(
+        "Account",
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name="ledger_entries",
+        help_text="Empty for the outside world (the mint, Lightning)",
+    )
+    amount = models.BigIntegerField(help_text="Signed change of the balance")
+    kind = models.CharField(max_length=10, choices=Kind.choices)
+    reference = models.CharField(
+        max_length=255, blank=True, help_text="E.g. the quote ID of a deposit"
+    )
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Covers the keyset scans of /accounts/history/ (Postgres only)
+            models.Index(
+                fields=["account", "-created_at", "-id"],
+                include=["txn_id", "amount", "kind", "reference"],
+                name="accounts_ledger_history",
+            ),
+            # For history pages filtered by kind
+            models.Index(
+                fields=["account", "kind", "-created_at", "-id"],
+                name="accounts_ledger_kind_hist",
+            ),
+            models.Index(fields=["txn_id"], name="accounts_ledger_txn"),
+        ]
+
+    def __str__(self):
+        if self.account_id is None:
+            return f"{self.kind} {self.amount:+} for the outside world"
+        return f"{self.kind} {self.amount:+} for account {self.account_id}"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Ledger entries are append-only")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Ledger entries are append-only")
+
+
 class Account(AbstractUser):
     balance = models.BigIntegerField(
         default=0, help_text="Account balance in smallest unit"
     )
+    balance_version = models.BigIntegerField(
+        default=0, help_text="Incremented with every balance change"
+    )
 
     class Meta:
         verbose_name = "Account"
         verbose_name_plural = "Accounts"
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None:
+            # Deferred fields aren't saved
+            saves_balance = "balance" not in self.get_deferred_fields()
+        else:
+            saves_balance = "balance" in update_fields
+        if saves_balance and not self._state.adding:
+            # Like every balance UPDATE, see accounts.balances
+            self.balance_version += 1
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "balance_version"}
+        super().save(*args, **kwargs)
+
     @property
     def is_owned_by_bank(self):
         """Whether this account is owned by coinbank (holds ecash)"""
@@ -0,0 +1,146 @@
+"""In-memory index of the bank wallet's spendable proofs.
+
+``WalletManager`` keeps one per worker so a withdrawal doesn't read and sort
+every proof in the wallet DB. Proofs are bucketed by keyset and denomination;
+picking proofs for an amount walks the denominations (at most a few dozen per
+keyset) instead of the proofs. Taken proofs are held aside until they are
+spent or put back, so concurrent withdrawals in a worker never get the same
+proofs. The wallet DB's ``reserved`` flag guards against other processes.
+"""
+
+from collections import defaultdict
+
+
+class ProofInventory:
+    def __init__(self):
+        # (keyset id, amount) -> {secret: proof}
+        self._buckets = defaultdict(dict)
+        # secret -> proof taken by a caller and not spent or put back yet
+        self._taken = {}
+
+    def __len__(self):
+        return sum(len(bucket) for bucket in self._buckets.values())
+
+    @property
+    def balance(self):
+        return sum(
+            amount * len(bucket) for (_, amount), bucket in self._buckets.items()
+        )
+
+    def load(self, proofs):
+        """Replace the inventory with ``proofs`` read from the wallet DB."""
+        self._buckets.clear()
+        self.add(proofs)
+
+    def add(self, proofs):
+        """Add spendable proofs. Reserved and taken proofs are skipped."""
+        for proof in proofs:
+            if not proof.reserved and proof.secret not in self._taken:
+                self._buckets[(proof.id, proof.amount)][proof.secret] = proof
+
+    def _denominations(self, keyset_ids):
+        """``[(amount, [bucket, ...]), ...]``, largest amount first."""
+        by_amount = defaultdict(list)
+        for (keyset_id, amount), bucket in self._buckets.items():
+            if bucket and keyset_id in keyset_ids:
+                by_amount[amount].append(bucket)
+        return sorted(by_amount.items(), reverse=True)
+
+    def _pop(self, buckets, count):
+        proofs = []
+        for bucket in buckets:
+            while bucket and len(proofs) < count:
+                proofs.append(bucket.popitem()[1])
+        for proof in proofs:
+            self._taken[proof.secret] = proof
+        return proofs
+
+    def take(self, amount, keyset_ids):
+        """Take proofs of the given keysets summing to exactly ``amount``.
+
+        Returns None if no combination adds up. Amounts are powers of two, so
+        taking as many of the largest amount as fit, then the next one and so
+        on, finds a combination whenever there is one.
+        """
+        plan = []
+        remaining = amount
+        for denomination, buckets in self._denominations(keyset_ids):
+            count = min(remaining // denomination, sum(map(len, buckets)))
+            if count:
+                plan.append((buckets, count))
+                remaining -= count * denomination
+        if remaining:
+            return None
+        return [proof for buckets, count in plan for proof in self._pop(buckets, count)]
+
+    def take_covering(self, amount, keyset_ids, fees=lambda proofs: 0):
+        """Take the largest proofs until they cover ``amount`` plus ``fees(proofs)``.
+
+        For swapping with the mint when ``take()`` finds no exact combination.
+        Returns None, taking nothing, if all proofs together don't cover it.
+        """
+
+        def largest_first():
+            for _, buckets in self._denominations(keyset_ids):
+                for bucket in buckets:
+                    yield from bucket.values()
+
+        proofs = []
+        total = 0
+        for proof in largest_first():
+            if total >= amount + fees(proofs):
+                break
+            proofs.append(proof)
+            total += proof.amount
+        if total < amount + fees(proofs):
+            return None
+        for proof in proofs:
+            del self._buckets[(proof.id, proof.amount)][proof.secret]
+            self._taken[proof.secret] = proof
+        return proofs
+
+    def counts(self, keyset_ids):
+        """Number of proofs of the given keysets per amount."""
+        return {
+            denomination: sum(map(len, buckets))
+            for denomination, buckets in self._denominations(keyset_ids)
+        }
+
+    def take_surplus(self, value, keyset_ids, targets, fees, limit):
+        """Take at most ``limit`` proofs beyond the ``targets`` count of their amount.
+
+        Largest first, until they cover ``value`` plus ``fees(proofs)`` or run
+        out; returns them even if they don't cover it (or None if there are
+        none), for swapping into the denominations that are short.
+        """
+        proofs = []
+        total = 0
+        for denomination, buckets in self._denominations(keyset_ids):
+            surplus = sum(map(len, buckets)) - targets.get(denomination, 0)
+            for bucket in buckets:
+                for proof in bucket.values():
+                    if surplus <= 0 or len(proofs) >= limit:
+                        break
+                    if total >= value + fees(proofs):
+                        break
+                    proofs.append(proof)
+                    total += proof.amount
+                    surplus -= 1
+        if not proofs:
+            return None
+        for proof in proofs:
+            del self._buckets[(proof.id, proof.amount)][proof.secret]
+            self._taken[proof.secret] = proof
+        return proofs
+
+    def put_back(self, proofs):
+        """Return taken proofs that were not spent."""
+        for proof in proofs:
+            self._taken.pop(proof.secret, None)
+        self.add(proofs)
+
+    def forget(self, proofs):
+        """Drop proofs that were spent, taken or claimed elsewhere."""
+        for proof in proofs:
+            self._taken.pop(proof.secret, None)
+            self._buckets[(proof.id, proof.amount)].pop(proof.secret, None)
@@ -0,0 +1,49 @@
+"""Learns which denominations withdrawals need, for ``WalletManager``.
+
+A withdrawal can be served from the proof inventory without a mint swap only
+if the bank holds the exact denominations of its amount. The rebalancer keeps
+the amounts of recent withdrawals and derives a target count per denomination
+(enough for the next ``DJANGO_REBALANCE_HORIZON`` withdrawals like them). The
+wallet manager swaps surplus proofs into the missing denominations while the
+wallet is idle, and steers the change of every other swap toward them too.
+"""
+
+import math
+from collections import Counter, deque
+
+from cashu.core.split import amount_split
+from django.conf import settings
+
+
+class Rebalancer:
+    def __init__(self, history_size=None, horizon=None):
+        self.recent = deque(
+            maxlen=history_size or settings.DJANGO_REBALANCE_HISTORY_SIZE
+        )
+        self.horizon = horizon or settings.DJANGO_REBALANCE_HORIZON
+
+    def record(self, amount):
+        self.recent.append(amount)
+
+    def targets(self):
+        """``{amount: count}`` of proofs to keep in stock."""
+        if not self.recent:
+            return {}
+        counts = Counter(
+            denomination
+            for amount in self.recent
+            for denomination in amount_split(amount)
+        )
+        scale = self.horizon / len(self.recent)
+        return {
+            denomination: math.ceil(count * scale)
+            for denomination, count in counts.items()
+        }
+
+    def deficits(self, counts):
+        """``{amount: count}`` missing from ``counts`` to reach the targets."""
+        return {
+            denomination: target - counts.get(denomination, 0)
+            for denomination, target in self.targets().items()
+            if target > counts.get(denomination, 0)
+        }
@@ -0,0 +1,136 @@
+"""Redemption of many bearer tokens at once, for the batch redeem endpoint.
+
+Proofs of tokens from the bank's mint are combined into as few swaps as the
+mint accepts (``DJANGO_REDEEM_SWAP_MAX_PROOFS`` inputs each). The mint rejects a
+whole swap if any input is spent or invalid, so when a combined swap fails its
+tokens are swapped one by one to find out which of them are bad. Tokens from
+other mints are received one by one, like ``redeem_bearer`` does.
+
+Tokens with proofs known to be spent (see ``accounts.spent_proofs``) are
+rejected before the wallet is borrowed; the proofs of redeemed tokens are
+recorded as spent, and so are the ones the mint reports spent when a token fails.
+"""
+
+import logging
+
+from cashu.wallet.helpers import deserialize_token_from_string, receive as cashu_receive
+from django.conf import settings
+
+from . import spent_proofs
+from .wallet import wallet_manager
+
+logger = logging.getLogger(__name__)
+
+
+def _chunks(tokens, max_proofs):
+    """Group ``(result, token)`` pairs so each group has at most ``max_proofs``
+    proofs (a single larger token gets a group of its own)."""
+    chunk = []
+    count = 0
+    for result, token in tokens:
+        if chunk and count + len(token.proofs) > max_proofs:
+            yield chunk
+            chunk = []
+            count = 0
+        chunk.append((result, token))
+        count += len(token.proofs)
+    if chunk:
+        yield chunk
+
+
+def _parse(tokens):
+    """Deserialize tokens. Returns the results and ``(result, token)`` pairs to redeem."""
+    results = []
+    parsed = []
+    seen = set()
+    for token in tokens:
+        result = {"amount": None}
+        results.append(result)
+        if not isinstance(token, str) or not token:
+            result["error"] = "Invalid token"
+            continue
+        try:
+            token_obj = deserialize_token_from_string(token)
+        except Exception as e:
+            result["error"] = f"Invalid token: {str(e)}"
+            continue
+        amount = sum(p.amount for p in token_obj.proofs)
+        result["amount"] = amount
+        secrets = {p.secret for p in token_obj.proofs}
+        if not amount or amount <= 0:
+            result["error"] = "Invalid token"
+        elif len(secrets) < len(token_obj.proofs) or secrets & seen:
+            # The mint would reject the whole swap the token ends up in
+            result["error"] = "Duplicate proofs"
+        else:
+            seen |= secrets
+            parsed.append((result, token_obj))
+    return results, parsed
+
+
+async def _redeem_one(wallet, result, token):
+    try:
+        if token.mint == wallet.url:
+            await wallet.redeem(token.proofs)
+        else:
+            await cashu_receive(wallet, token)
+    except Exception as e:
+        result["error"] = f"Invalid token: {str(e)}"
+        if token.mint == wallet.url:
+            await record_failed(wallet, token.proofs)
+        return
+    await spent_proofs.record(p.Y for p in token.proofs)
+
+
+async def record_failed(wallet, proofs):
+    try:
+        await spent_proofs.record_states(wallet, proofs)
+    except Exception as e:
+        logger.warning("Could not check proof states: %s", e)
+
+
+async def _reject_spent(parsed):
+    """Mark tokens with known spent proofs failed, returns the other pairs."""
+    spent = await spent_proofs.spent(p.Y for _, token in parsed for p in token.proofs)
+    if not spent:
+        return parsed
+    unspent = []
+    for result, token in parsed:
+        if any(p.Y in spent for p in token.proofs):
+            result["error"] = "Token already spent"
+        else:
+            unspent.append((result, token))
+    return unspent
+
+
+async def redeem_tokens(tokens):
+    """Redeem serialized tokens into the bank's wallet.
+
+    Returns one result per token, in order: ``{"amount": ..., "error": ...}``,
+    without ``error`` for tokens that were redeemed. Crediting them is up to the
+    caller.
+    """
+    results, parsed = _parse(tokens)
+    parsed = await _reject_spent(parsed)
+    if not parsed:
+        return results
+    async with wallet_manager.borrow(exclusive=True) as wallet:
+        local = [(r, t) for r, t in parsed if t.mint == wallet.url]
+        for result, token in parsed:
+            if token.mint != wallet.url:
+                await _redeem_one(wallet, result, token)
+
+        for chunk in _chunks(local, settings.DJANGO_REDEEM_SWAP_MAX_PROOFS):
+            if len(chunk) == 1:
+                await _redeem_one(wallet, *chunk[0])
+                continue
+            try:
+                proofs = [p for _, token in chunk for p in token.proofs]
+                await wallet.redeem(proofs)
+            except Exception as e:
+                logger.info("Combined swap of %s tokens failed: %s", len(chunk), e)
+                for result, token in chunk:
+                    await _redeem_one(wallet, result, token)
+                continue
+            await spent_proofs.record(p.Y for p in proofs)
+    return results
@@ -0,0 +1,143 @@
+"""Routing of read-only views and reporting queries to read replicas.
+
+Reads go to the primary unless they run inside ``use_replicas()`` (or a view
+decorated with ``replica_reads``); then they go to a random replica from
+``DJANGO_DATABASE_REPLICAS``. Writes, locking reads (``select_for_update``)
+and reads inside a transaction always go to the primary.
+
+Replicas lag behind the primary. So that a client sees its own writes,
+``primary_pin_middleware`` sets a cookie after every successful write request
+and keeps that client's reads on the primary for the next
+``DJANGO_REPLICA_PIN_SECONDS``.
+"""
+
+import functools
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import StreamingHttpResponse
+from django.utils.decorators import sync_and_async_middleware
+
+PIN_COOKIE = "primary_pin"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+_reads = ContextVar("replica_reads", default=False)
+_pinned = ContextVar("primary_pinned", default=False)
+
+
+@contextmanager
+def use_replicas(enabled=True):
+    """Send reads in the block to the replicas, unless pinned to the primary."""
+    previous = _reads.get()
+    _reads.set(enabled and not _pinned.get())
+    try:
+        yield
+    finally:
+        _reads.set(previous)
+
+
+def _stream(content, reads):
+    # Streamed responses are iterated after the view returned
+    if hasattr(content, "__aiter__"):
+
+        async def stream():
+            with use_replicas(reads):
+                async for part in content:
+                    yield part
+
+    else:
+
+        def stream():
+            with use_replicas(reads):
+                yield from content
+
+    return stream()
+
+
+def replica_reads(view):
+    """Run a read-only view's queries (including a streamed response's) on the replicas."""
+
+    def route_stream(response):
+        if isinstance(response, StreamingHttpResponse):
+            response.streaming_content = _stream(
+                response.streaming_content, _reads.get()
+            )
+        return response
+
+    if iscoroutinefunction(view):
+
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            with use_replicas():
+                return route_stream(await view(request, *args, **kwargs))
+
+    else:
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            with use_replicas():
+                return route_stream(view(request, *args, **kwargs))
+
+    return wrapper
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not _reads.get() or not settings.DJANGO_DATABASE_REPLICAS:
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None  # Reads in a transaction must see its writes
+        return random.choice(settings.DJANGO_DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Replicas get the schema by replication
+        return db == DEFAULT_DB_ALIAS
+
+
+def _pin(request, response):
+    if request.method not in SAFE_METHODS and response.status_code < 400:
+        response.set_cookie(
+            PIN_COOKIE,
+            "1",
+            max_age=settings.DJANGO_REPLICA_PIN_SECONDS,
+            httponly=True,
+            samesite="Lax",
+        )
+    return response
+
+
+@sync_and_async_middleware
+def primary_pin_middleware(get_response):
+    """Keep a client's reads on the primary for a while after it wrote."""
+
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            token = _pinned.set(PIN_COOKIE in request.COOKIES)
+            try:
+                response = await get_response(request)
+            finally:
+                _pinned.reset(token)
+            return _pin(request, response)
+
+    else:
+
+        def middleware(request):
+            token = _pinned.set(PIN_COOKIE in request.COOKIES)
+            try:
+                response = get_response(request)
+            finally:
+                _pinned.reset(token)
+            return _pin(request, response)
+
+    return middleware
@@ -0,0 +1,170 @@
+"""Settlement of deposit invoices, run by the ``settledeposits`` command.
+
+Pending deposits are checked against the mint in batches. Paid quotes are
+minted into the bank's wallet and credited; overdue unpaid ones are expired.
+Quotes that are still unpaid are checked again with exponential backoff, so
+thousands of open invoices don't turn into thousands of mint calls per tick.
+
+A deposit's ``expires_at`` is only how long the invoice is offered; the mint's
+quote may be paid until its own ``expiry``, which is usually later. So expired
+deposits (by this worker or the ``expirepayments`` sweeper, which doesn't ask
+the mint) keep being checked, with backoff, until the mint's quote has expired
+too, for at most ``DJANGO_SETTLEMENT_RECHECK_SECONDS`` after ``expires_at``. One
+paid late, or while this worker was down, is still credited.
+"""
+
+import asyncio
+import logging
+import time
+from datetime import timedelta
+
+from cashu.core.base import MintQuoteState
+from django.conf import settings
+from django.utils import timezone
+
+from . import transfers
+from .db import in_db_thread
+from .models import PaymentRequest
+from .routers import use_replicas
+from .wallet import wallet_manager
+
+logger = logging.getLogger(__name__)
+
+
+@in_db_thread
+@use_replicas()
+def _get_pending_deposits():
+    # Replica lag only delays a check; settle_deposit re-checks on the primary
+    return list(
+        PaymentRequest.objects.filter(
+            request_type=PaymentRequest.RequestType.DEPOSIT,
+            status=PaymentRequest.Status.PENDING,
+        )
+        .order_by("expires_at")
+        .only("id", "account_id", "amount", "quote_id", "status", "expires_at")
+    )
+
+
+@in_db_thread
+@use_replicas()
+def _get_expired_deposits(since):
+    return list(
+        PaymentRequest.objects.filter(
+            request_type=PaymentRequest.RequestType.DEPOSIT,
+            status=PaymentRequest.Status.EXPIRED,
+            expires_at__gte=since,
+        )
+        .order_by("expires_at")
+        .only("id", "account_id", "amount", "quote_id", "status", "expires_at")
+    )
+
+
+_settle_deposit = in_db_thread(transfers.settle_deposit)
+_mark_expired = in_db_thread(transfers.expire_payment_request)
+
+
+class DepositSettler:
+    def __init__(self, batch_size=None, interval=None, max_backoff=None, recheck=None):
+        self.batch_size = batch_size or settings.DJANGO_SETTLEMENT_BATCH_SIZE
+        self.interval = interval or settings.DJANGO_SETTLEMENT_INTERVAL_SECONDS
+        self.max_backoff = max_backoff or settings.DJANGO_SETTLEMENT_MAX_BACKOFF_SECONDS
+        if recheck is None:
+            recheck = settings.DJANGO_SETTLEMENT_RECHECK_SECONDS
+        self.recheck = recheck
+        # payment request id -> (monotonic time of next check, current delay)
+        self._backoff = {}
+        # Expired deposits the mint confirmed unpaid after its quote expired
+        self._confirmed_expired = set()
+
+    def _is_due(self, payment_request_id, now):
+        next_check, _ = self._backoff.get(payment_request_id, (0, 0))
+        return next_check <= now
+
+    def _defer(self, payment_request_id, now):
+        _, delay = self._backoff.get(payment_request_id, (0, self.interval / 2))
+        delay = min(delay * 2, self.max_backoff)
+        self._backoff[payment_request_id] = (now + delay, delay)
+
+    async def _settle(self, payment_request):
+        """Check one deposit's quote and settle it. Returns the new status, or None."""
+        async with wallet_manager.borrow() as wallet:
+            quote = await wallet.get_mint_quote(payment_request.quote_id)
+
+        if quote.state == MintQuoteState.paid:
+            async with wallet_manager.borrow(exclusive=True) as wallet:
+                await wallet.mint(
+                    payment_request.amount, quote_id=payment_request.quote_id
+                )
+            if payment_request.status == PaymentRequest.Status.EXPIRED:
+                logger.warning("Crediting expired quote %s", quote.quote)
+            await _settle_deposit(payment_request.id)
+            return PaymentRequest.Status.PAID
+
+        if quote.state == MintQuoteState.issued:
+            # Minted on an earlier pass but the credit did not commit
+            logger.warning("Crediting already issued quote %s", quote.quote)
+            await _settle_deposit(payment_request.id)
+            return PaymentRequest.Status.PAID
+
+        if payment_request.status == PaymentRequest.Status.EXPIRED:
+            # Only final once the mint's quote expired; one without an expiry is
+            # checked for the whole recheck window
+            if quote.expiry is not None and quote.expiry <= time.time():
+                self._confirmed_expired.add(payment_request.id)
+            return None
+
+        # Only expire after the mint confirmed the invoice is still unpaid
+        if payment_request.expires_at <= timezone.now():
+            await _mark_expired(payment_request)
+            return PaymentRequest.Status.EXPIRED
+
+        return None
+
+    async def settle_once(self):
+        """Check every due pending deposit once. Returns counts per outcome."""
+        pending = await _get_pending_deposits()
+        if self.recheck:
+            expired = await _get_expired_deposits(
+                timezone.now() - timedelta(seconds=self.recheck)
+            )
+            self._confirmed_expired &= {pr.id for pr in expired}
+            pending += [pr for pr in expired if pr.id not in self._confirmed_expired]
+        pending_ids = {payment_request.id for payment_request in pending}
+        self._backoff = {k: v for k, v in self._backoff.items() if k in pending_ids}
+
+        now = time.monotonic()
+        due = [pr for pr in pending if self._is_due(pr.id, now)]
+        counts = {"checked": len(due), "paid": 0, "expired": 0, "failed": 0}
+
+        for start in range(0, len(due), self.batch_size):
+            batch = due[start : start + self.batch_size]
+            results = await asyncio.gather(
+                *(self._settle(pr) for pr in batch), return_exceptions=True
+            )
+            for payment_request, result in zip(batch, results):
+                if isinstance(result, Exception):
+                    logger.warning(
+                        "Could not settle deposit %s: %s",
+                        payment_request.quote_id,
+                        result,
+                    )
+                    counts["failed"] += 1
+                    self._defer(payment_request.id, now)
+                elif result == PaymentRequest.Status.PAID:
+                    counts["paid"] += 1
+                elif result == PaymentRequest.Status.EXPIRED:
+                    counts["expired"] += 1
+                else:
+                    self._defer(payment_request.id, now)
+
+        return counts
+
+    async def run(self):
+        while True:
+            try:
+                counts = await self.settle_once()
+                if counts["paid"] or counts["expired"]:
+                    logger.info("Settlement pass: %s", counts)
+            except Exception:
+                logger.exception("Settlement pass failed")
+            await asyncio.sleep(self.interval)
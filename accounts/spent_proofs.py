@@ -0,0 +1,155 @@
+"""Index of proofs known to be spent, to reject replayed tokens locally.
+
+The exact set is the ``SpentProof`` table. Each process keeps a Bloom filter of
+it in front: a proof the filter has never seen (nearly every proof of a fresh
+token) is known not to be in the set without a query, and only the few that
+may be in it are looked up. The filter is built from the table in the
+background at startup (``start()``), all proofs are looked up until it is ready.
+It learns the proofs this process records once they commit; proofs recorded by
+other processes are missed until they are recorded here too, which only costs a
+mint call.
+"""
+
+import asyncio
+import logging
+import math
+import threading
+
+from cashu.core.base import ProofSpentState
+from django.conf import settings
+from django.db import transaction
+
+from .db import in_db_thread
+from .models import SpentProof
+
+logger = logging.getLogger(__name__)
+
+INSERT_BATCH_SIZE = 1000
+LOAD_CHUNK_SIZE = 10000
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate):
+        self.size = max(
+            8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        )
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, y):
+        # Y is a compressed curve point, its x coordinate is already uniform
+        digest = bytes.fromhex(y[2:34])
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:], "big") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, y):
+        for position in self._positions(y):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, y):
+        return all(
+            self._bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(y)
+        )
+
+
+class SpentIndex:
+    def __init__(self):
+        self._bloom = None
+        # Proofs recorded while the filter is being built, None when not building
+        self._learned = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Build the Bloom filter from the table, unless it is built already."""
+        with self._lock:
+            if self._bloom is not None or self._learned is not None:
+                return
+            self._learned = []
+        try:
+            bloom = BloomFilter(
+                settings.DJANGO_SPENT_BLOOM_CAPACITY,
+                settings.DJANGO_SPENT_BLOOM_ERROR_RATE,
+            )
+            for y in SpentProof.objects.values_list("y", flat=True).iterator(
+                chunk_size=LOAD_CHUNK_SIZE
+            ):
+                bloom.add(y)
+        except Exception:
+            with self._lock:
+                self._learned = None
+            raise
+        with self._lock:
+            # Committed after the scan started, so it may not have seen them
+            for y in self._learned:
+                bloom.add(y)
+            self._learned = None
+            self._bloom = bloom
+
+    def _learn(self, ys):
+        with self._lock:
+            if self._bloom is not None:
+                for y in ys:
+                    self._bloom.add(y)
+            elif self._learned is not None:
+                self._learned.extend(ys)
+
+    def spent(self, ys):
+        """The ones of ``ys`` known to be spent."""
+        bloom = self._bloom
+        if bloom is None:
+            candidates = list(ys)
+        else:
+            candidates = [y for y in ys if y in bloom]
+        if not candidates:
+            return set()
+        return set(
+            SpentProof.objects.filter(y__in=candidates).values_list("y", flat=True)
+        )
+
+    def record(self, ys):
+        """Record proofs as spent, in the caller's transaction if there is one."""
+        ys = set(ys)
+        if not ys:
+            return
+        SpentProof.objects.bulk_create(
+            [SpentProof(y=y) for y in ys],
+            batch_size=INSERT_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+        # Once committed, rolled back ones would only be false positives
+        transaction.on_commit(lambda: self._learn(ys))
+
+
+spent_index = SpentIndex()
+
+spent = in_db_thread(spent_index.spent)
+record = in_db_thread(spent_index.record)
+_load = in_db_thread(spent_index.load)
+_loader = None
+
+
+async def _load_in_background():
+    try:
+        await _load()
+    except Exception:
+        logger.exception("Could not build the spent proof filter")
+
+
+def start():
+    """Build the Bloom filter in the background, once per process."""
+    global _loader
+    if _loader is None:
+        _loader = asyncio.create_task(_load_in_background())
+
+
+async def record_states(wallet, proofs):
+    """Ask the mint (NUT-07) which of ``proofs`` are spent and record those.
+
+    Returns the Ys of the spent ones.
+    """
+    response = await wallet.check_proof_state(proofs)
+    ys = {state.Y for state in response.states if state.state == ProofSpentState.spent}
+    await record(ys)
+    return ys
@@ -1,3 +1,392 @@
-from django.test import TestCase
+import json
+import uuid
+from collections import Counter
+from datetime import timedelta
+from secrets import token_hex
 
-# Create your tests here.
+from cashu.core.base import Proof, TokenV3, TokenV3Token
+from cashu.core.crypto.secp import PrivateKey
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from . import history, ledger, spent_proofs, transfers
+from .models import Account, LedgerEntry, SpentProof
+
+
+def _create_bank():
+    # ledger caches the bank's id, which a previous test's bank may have had
+    ledger._bank_account_id = None
+    return Account.objects.create_superuser(settings.DJANGO_BANK_WALLET, password="x")
+
+
+def _create_user(username, balance=0):
+    user = Account.objects.create_user(username, password="x")
+    if balance:
+        transfers.credit_user_and_bank(user.id, balance)
+    return user
+
+
+def _balance(account):
+    return Account.objects.get(id=account.id).balance
+
+
+class DebitTests(TestCase):
+    def setUp(self):
+        self.bank = _create_bank()
+        self.alice = _create_user("alice", balance=100)
+        self.bob = _create_user("bob")
+
+    def test_debit_not_covered_changes_nothing(self):
+        self.assertIsNone(transfers.debit(self.alice.id, 101))
+        self.assertEqual(_balance(self.alice), 100)
+
+    def test_debit_covered(self):
+        account = transfers.debit(self.alice.id, 100)
+        self.assertEqual(account.balance, 0)
+        self.assertEqual(_balance(self.alice), 0)
+
+    def test_transfer_not_covered_changes_nothing(self):
+        self.assertIsNone(
+            transfers.transfer_between_users(self.alice.id, self.bob.id, 101)
+        )
+        self.assertEqual(_balance(self.alice), 100)
+        self.assertEqual(_balance(self.bob), 0)
+
+    def test_withdraw_not_covered_raises(self):
+        with self.assertRaises(transfers.InsufficientBalance):
+            transfers.debit_user_and_bank(self.alice.id, 101)
+        self.assertEqual(_balance(self.alice), 100)
+
+    def test_bank_debit_checks_pending_balance(self):
+        # The bank's 100 are all pending changes, its row is still at 0
+        self.assertEqual(
+            transfers.transfer_between_users(self.bank.id, self.bob.id, 60), 40
+        )
+        self.assertIsNone(
+            transfers.transfer_between_users(self.bank.id, self.bob.id, 41)
+        )
+        self.assertEqual(_balance(self.bob), 60)
+
+
+class _PgError(Exception):
+    def __init__(self, pgcode):
+        super().__init__(pgcode)
+        self.pgcode = pgcode
+
+
+def _aborted(pgcode):
+    error = DatabaseError("aborted")
+    error.__cause__ = _PgError(pgcode)
+    return error
+
+
+@override_settings(
+    DJANGO_TRANSFER_MAX_RETRIES=2, DJANGO_TRANSFER_RETRY_BACKOFF_SECONDS=0
+)
+class RetryingTests(TransactionTestCase):
+    def _failing(self, *pgcodes):
+        """A retrying function raising the given errors in turn, then returning."""
+        errors = [_aborted(pgcode) for pgcode in pgcodes]
+        calls = []
+
+        @transfers.retrying
+        def func():
+            calls.append(transaction.get_connection().in_atomic_block)
+            if errors:
+                raise errors.pop(0)
+            return "done"
+
+        return func, calls
+
+    def _retries(self, func):
+        before = Counter(transfers.retry_counts())
+        try:
+            return func()
+        finally:
+            self.retried = Counter(transfers.retry_counts()) - before
+
+    def test_serialization_failure_and_deadlock_are_retried(self):
+        func, calls = self._failing("40001", "40P01")
+        self.assertEqual(self._retries(func), "done")
+        self.assertEqual(calls, [True, True, True])
+        self.assertEqual(
+            self.retried,
+            Counter({"serialization_failure": 1, "deadlock_detected": 1}),
+        )
+
+    def test_retries_exhausted(self):
+        func, calls = self._failing("40001", "40001", "40001")
+        with self.assertRaises(DatabaseError):
+            self._retries(func)
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(
+            self.retried, Counter({"serialization_failure": 2, "exhausted": 1})
+        )
+
+    def test_other_errors_are_not_retried(self):
+        func, calls = self._failing("23505")
+        with self.assertRaises(DatabaseError):
+            self._retries(func)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(self.retried, Counter())
+
+    def test_inner_transaction_leaves_the_error_to_the_outer_one(self):
+        func, calls = self._failing("40001")
+        with self.assertRaises(DatabaseError):
+            with transaction.atomic():
+                self._retries(func)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(self.retried, Counter())
+
+
+# Not in a test transaction, the transfers' own one is what rolls them back
+class BatchTransferTests(TransactionTestCase):
+    def setUp(self):
+        self.bank = _create_bank()
+        self.alice = _create_user("alice", balance=100)
+        self.bob = _create_user("bob")
+        self.carol = _create_user("carol")
+        self.dave = _create_user("dave")
+        self.client.force_login(self.alice)
+
+    def _send(self, entries):
+        return self.client.post(
+            "/api/accounts/send/batch/",
+            json.dumps({"transfers": entries}),
+            content_type="application/json",
+        )
+
+    def _balances(self):
+        return [
+            _balance(account)
+            for account in (self.alice, self.bob, self.carol, self.dave)
+        ]
+
+    def test_batch(self):
+        response = self._send(
+            [
+                {"recipient_username": "bob", "amount": 10},
+                {"recipient_username": "carol", "amount": 20},
+                {"recipient_username": "bob", "amount": 5},
+            ]
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["new_balance"], 65)
+        self.assertEqual(self._balances(), [65, 15, 20, 0])
+
+    def test_batch_not_covered_sends_nothing(self):
+        # Three accounts take the locking path, two the guarded one
+        for entries in (
+            [
+                {"recipient_username": "bob", "amount": 50},
+                {"recipient_username": "carol", "amount": 51},
+            ],
+            [{"recipient_username": "bob", "amount": 101}],
+        ):
+            response = self._send(entries)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json()["error"], "Insufficient balance")
+            self.assertEqual(self._balances(), [100, 0, 0, 0])
+
+    def test_invalid_entry_sends_nothing(self):
+        response = self._send(
+            [
+                {"recipient_username": "bob", "amount": 10},
+                {"recipient_username": "nobody", "amount": 10},
+                {"recipient_username": "carol", "amount": 0},
+                {"recipient_username": "dave", "amount": "ten"},
+                {"recipient_username": "alice", "amount": 10},
+                "bob",
+            ]
+        )
+        self.assertEqual(response.status_code, 400)
+        errors = [result.get("error") for result in response.json()["results"]]
+        self.assertEqual(
+            errors,
+            [
+                None,
+                "Recipient not found",
+                "Amount must be positive",
+                "Invalid amount",
+                "Cannot send to yourself",
+                "Invalid amount",
+            ],
+        )
+        self.assertEqual(self._balances(), [100, 0, 0, 0])
+
+    def test_missing_transfers(self):
+        for body in ({}, {"transfers": []}, {"transfers": "bob"}, []):
+            response = self.client.post(
+                "/api/accounts/send/batch/",
+                json.dumps(body),
+                content_type="application/json",
+            )
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json()["error"], "transfers is required")
+
+    @override_settings(DJANGO_TRANSFER_BATCH_MAX_SIZE=2)
+    def test_too_many_transfers(self):
+        response = self._send([{"recipient_username": "bob", "amount": 1}] * 3)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["error"], "At most 2 transfers per batch")
+        self.assertEqual(self._balances(), [100, 0, 0, 0])
+
+    def test_failure_after_a_credit_rolls_back(self):
+        # Rows are changed in id order, so bob is credited before these fail
+        missing = self.dave.id + 1000
+        for amounts in ({self.bob.id: 10, missing: 10}, {missing: 10}):
+            with self.assertRaises(Account.DoesNotExist):
+                transfers.transfer_to_users(self.alice.id, amounts)
+        self.assertIsNone(transfers.transfer_to_users(self.dave.id, {self.bob.id: 1}))
+        self.assertEqual(self._balances(), [100, 0, 0, 0])
+        self.assertEqual(ledger.verify(), {})
+
+
+class LedgerTests(TestCase):
+    def setUp(self):
+        self.bank = _create_bank()
+        self.alice = _create_user("alice", balance=100)
+        self.bob = _create_user("bob")
+
+    def test_transactions_sum_to_zero(self):
+        transfers.transfer_between_users(self.alice.id, self.bob.id, 30)
+        transfers.transfer_to_users(self.alice.id, {self.bob.id: 5, self.bank.id: 5})
+        transfers.debit_user_and_bank(self.bob.id, 10, kind=transfers.Kind.WITHDRAW)
+        transfers.credit_user_and_bank(self.bank.id, 7)
+        transfers.transfer_between_users(self.bank.id, self.alice.id, 3)
+        with self.assertRaises(transfers.InsufficientBalance):
+            transfers.debit_user_and_bank(self.bob.id, 1000)
+
+        self.assertEqual(ledger.unbalanced(), {})
+        # alice's deposit and the five above
+        self.assertEqual(LedgerEntry.objects.values("txn_id").distinct().count(), 6)
+        self.assertEqual(ledger.verify(), {})
+
+    def test_unbalanced_transaction_is_reported(self):
+        txn_id = uuid.uuid4()
+        LedgerEntry.objects.create(
+            txn_id=txn_id, account=self.alice, amount=5, kind=LedgerEntry.Kind.DEPOSIT
+        )
+        self.assertEqual(ledger.unbalanced(), {txn_id: 5})
+
+
+class HistoryPaginationTests(TestCase):
+    def setUp(self):
+        self.alice = _create_user("alice")
+        now = timezone.now()
+        # Rows sharing created_at are ordered by id
+        times = [now, now, now - timedelta(seconds=1), now, now - timedelta(seconds=2)]
+        LedgerEntry.objects.bulk_create(
+            LedgerEntry(
+                txn_id=uuid.uuid4(),
+                account=self.alice,
+                amount=i,
+                kind=LedgerEntry.Kind.TRANSFER,
+                created_at=created_at,
+            )
+            for i, created_at in enumerate(times)
+        )
+        self.expected = list(
+            LedgerEntry.objects.filter(account=self.alice)
+            .order_by("-created_at", "-id")
+            .values_list("id", flat=True)
+        )
+
+    def _pages(self, limit):
+        pages = []
+        cursor = None
+        while True:
+            rows, cursor = history.ledger_page(
+                self.alice.id, cursor=cursor, limit=limit
+            )
+            pages.append([row["id"] for row in rows])
+            if cursor is None:
+                return pages
+
+    def test_pages_cover_every_row_once(self):
+        for limit in range(1, 7):
+            pages = self._pages(limit)
+            self.assertEqual(sum(pages, []), self.expected)
+            self.assertTrue(all(len(page) == limit for page in pages[:-1]))
+
+    def test_last_full_page_has_no_cursor(self):
+        self.assertEqual(self._pages(5), [self.expected])
+        rows, cursor = history.ledger_page(self.alice.id, limit=5)
+        self.assertIsNone(cursor)
+
+    def test_cursor_inside_tied_rows(self):
+        # The first two rows are tied, the next page starts at the second one
+        rows, cursor = history.ledger_page(self.alice.id, limit=1)
+        rows, _ = history.ledger_page(self.alice.id, cursor=cursor, limit=2)
+        self.assertEqual([row["id"] for row in rows], self.expected[1:3])
+
+    def test_invalid_cursor(self):
+        for cursor in ("nope", "bm9wZQ==", "WyJub3BlIiwgMV0="):
+            with self.assertRaises(history.InvalidCursor):
+                history.ledger_page(self.alice.id, cursor=cursor)
+
+
+def _token(*amounts):
+    proofs = [
+        Proof(
+            id="009a1f293253e41e",
+            amount=amount,
+            secret=token_hex(32),
+            C=PrivateKey().pubkey.serialize().hex(),
+        )
+        for amount in amounts
+    ]
+    token = TokenV3(token=[TokenV3Token(mint=settings.DJANGO_MINT_URL, proofs=proofs)])
+    return token, token.serialize()
+
+
+class SpentProofTests(TransactionTestCase):
+    def setUp(self):
+        self.alice = _create_user("alice")
+        self.client.force_login(self.alice)
+
+    def _post(self, path, body):
+        return self.client.post(path, json.dumps(body), content_type="application/json")
+
+    def test_index(self):
+        index = spent_proofs.SpentIndex()
+        spent, unspent = token_hex(33), token_hex(33)
+        index.record([spent])
+        # Before the filter is built every proof is looked up
+        self.assertEqual(index.spent([spent, unspent]), {spent})
+        index.load()
+        self.assertEqual(index.spent([spent, unspent]), {spent})
+
+        rolled_back = token_hex(33)
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                index.record([rolled_back])
+                raise RuntimeError
+        self.assertEqual(index.spent([rolled_back]), set())
+        index.record([rolled_back])
+        self.assertEqual(index.spent([rolled_back]), {rolled_back})
+
+    def test_redeem_rejects_spent_token(self):
+        token, serialized = _token(8, 2)
+        SpentProof.objects.create(y=token.proofs[1].Y)
+        response = self._post("/api/accounts/redeem/", {"token": serialized})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["error"], "Token already spent")
+        self.assertEqual(_balance(self.alice), 0)
+
+    def test_batch_redeem_rejects_spent_tokens(self):
+        spent, spent_serialized = _token(4)
+        _, other_serialized = _token(1)
+        SpentProof.objects.create(y=spent.proofs[0].Y)
+        # The other token is invalid, so neither needs the mint
+        response = self._post(
+            "/api/accounts/redeem/batch/",
+            {"tokens": [spent_serialized, other_serialized[:-4]]},
+        )
+        self.assertEqual(response.status_code, 400)
+        results = response.json()["results"]
+        self.assertEqual(results[0]["error"], "Token already spent")
+        self.assertFalse(results[1]["success"])
+        self.assertEqual(_balance(self.alice), 0)
@@ -0,0 +1,328 @@
+"""Every change to account balances goes through this module.
+
+Balances are changed with single guarded UPDATEs, taken in primary key order
+so two transfers between the same accounts in opposite directions can't
+deadlock, and journaled in the ledger (see ``accounts.ledger``) in the same
+transaction. Transactions Postgres aborts anyway (deadlock with some other lock,
+serialization failure) are retried with jittered backoff; ``retry_counts()``
+reports how often that happened in this process.
+"""
+
+import functools
+import random
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.models import F
+
+from . import aggregates, balances, events, ledger, spent_proofs
+from .models import Account, PaymentRequest
+
+Kind = ledger.Kind
+
+# SQLSTATEs of aborted transactions that can simply be run again
+RETRYABLE_ERRORS = {
+    "40001": "serialization_failure",
+    "40P01": "deadlock_detected",
+}
+
+_retries = Counter()
+_retries_lock = threading.Lock()
+
+
+class InsufficientBalance(ValueError):
+    def __init__(self, message="Insufficient balance"):
+        super().__init__(message)
+
+
+def retry_counts():
+    """Retried transactions of this process per reason, and retries exhausted."""
+    with _retries_lock:
+        return dict(_retries)
+
+
+def _count_retry(reason):
+    with _retries_lock:
+        _retries[reason] += 1
+
+
+def retrying(func):
+    """Run ``func`` in a transaction, retrying it if Postgres aborts it.
+
+    Called inside an outer transaction ``func`` just joins it: only the
+    outermost transaction can be retried, so the error is left to it.
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if transaction.get_connection().in_atomic_block:
+            return func(*args, **kwargs)
+        attempt = 0
+        while True:
+            try:
+                with transaction.atomic():
+                    return func(*args, **kwargs)
+            except DatabaseError as e:
+                reason = RETRYABLE_ERRORS.get(getattr(e.__cause__, "pgcode", None))
+                if reason is None:
+                    raise
+                if attempt >= settings.DJANGO_TRANSFER_MAX_RETRIES:
+                    _count_retry("exhausted")
+                    raise
+                _count_retry(reason)
+                # Full jitter, so the transactions that collided don't again
+                backoff = settings.DJANGO_TRANSFER_RETRY_BACKOFF_SECONDS * 2**attempt
+                time.sleep(random.uniform(0, backoff))
+                attempt += 1
+
+    return wrapper
+
+
+# Above this many accounts, changes are applied with one locking SELECT and
+# bulk UPDATEs instead of one guarded UPDATE per account
+BULK_THRESHOLD = 2
+BULK_UPDATE_BATCH_SIZE = 1000
+
+
+READ_BACK_FIELDS = ("id", "balance", "balance_version", "is_staff")
+
+
+def _read_back(account_id):
+    return Account.objects.only(*READ_BACK_FIELDS).get(id=account_id)
+
+
+def credit(account_id, amount):
+    """Add ``amount`` to an account's balance in a single UPDATE.
+
+    Returns the account with its new ``balance`` (and ``is_staff``) loaded.
+    """
+    if not Account.objects.filter(id=account_id).update(
+        balance=F("balance") + amount, balance_version=F("balance_version") + 1
+    ):
+        raise Account.DoesNotExist(f"Account {account_id} does not exist")
+    return _read_back(account_id)
+
+
+def debit(account_id, amount):
+    """Subtract ``amount`` from an account's balance if the balance covers it.
+
+    Runs ``UPDATE ... SET balance = balance - amount WHERE id = ... AND
+    balance >= amount``; no row updated means insufficient balance (or no such
+    account), and None is returned. Otherwise returns the account like
+    ``credit()``.
+    """
+    if not Account.objects.filter(id=account_id, balance__gte=amount).update(
+        balance=F("balance") - amount, balance_version=F("balance_version") + 1
+    ):
+        return None
+    return _read_back(account_id)
+
+
+@retrying
+def apply_balance_changes(changes, *, kind, bank_delta=0, reference=""):
+    """Apply ``{account_id: delta}`` balance changes in one transaction.
+
+    Rows are updated (and so locked) in primary key order. Raises
+    ``InsufficientBalance`` and changes nothing if any debit isn't covered.
+    ``bank_delta`` is passed on to ``aggregates.record_balance_changes()``.
+    A debit of the bank account is checked against its whole balance, pending
+    changes included, and recorded as a pending change too; its row is only
+    locked, in order, so the bank's debits are serialized.
+    Every change is journaled as a ledger entry of ``kind``, and the new
+    balances are cached on commit (see ``accounts.balances``).
+    Returns ``{account_id: new balance}``.
+    """
+    bank_id = ledger.bank_account_id()
+    bank_debit = min(changes.get(bank_id, 0), 0)
+    if len(changes) > BULK_THRESHOLD:
+        applied = _apply_locked(changes, bank_id)
+    else:
+        applied = _apply_guarded(changes, bank_id)
+    bank_delta += bank_debit
+    aggregates.record_balance_changes(*applied, bank_delta=bank_delta)
+    with ledger.journal(kind, reference) as journal:
+        for account, delta in applied:
+            journal.add(account.id, delta)
+        journal.add_bank(bank_delta)
+    new_balances = {account.id: account.balance for account, _ in applied}
+    if bank_debit:
+        new_balances[bank_id] = aggregates.bank_balance()
+    events.publish_balances(new_balances)
+    balances.store_many(
+        {
+            account.id: (account.balance, account.balance_version)
+            for account, _ in applied
+        }
+    )
+    return new_balances
+
+
+def _check_bank_debit(bank_id, amount):
+    # The bank's row is only locked, which serializes its debits: they are
+    # checked against its whole balance, including pending changes
+    list(Account.objects.select_for_update().filter(id=bank_id).values_list("id"))
+    if aggregates.bank_balance() < amount:
+        raise InsufficientBalance()
+
+
+def _apply_guarded(changes, bank_id):
+    # Returns the changes applied to rows, without a debit of the bank
+    applied = []
+    for account_id in sorted(changes):
+        delta = changes[account_id]
+        if delta < 0 and account_id == bank_id:
+            _check_bank_debit(bank_id, -delta)
+            continue
+        if delta < 0:
+            account = debit(account_id, -delta)
+            if account is None:
+                raise InsufficientBalance()
+        else:
+            account = credit(account_id, delta)
+        applied.append((account, delta))
+    return applied
+
+
+def _apply_locked(changes, bank_id):
+    # One ordered pass locks every row, then only the balance columns are written;
+    # like _apply_guarded(), a debit of the bank is left out
+    accounts = list(
+        Account.objects.select_for_update()
+        .filter(id__in=changes)
+        .order_by("id")
+        .only(*READ_BACK_FIELDS)
+    )
+    if len(accounts) != len(changes):
+        raise Account.DoesNotExist("Some accounts do not exist")
+    if changes.get(bank_id, 0) < 0:
+        if aggregates.bank_balance() < -changes[bank_id]:
+            raise InsufficientBalance()
+        accounts = [account for account in accounts if account.id != bank_id]
+    for account in accounts:
+        delta = changes[account.id]
+        if delta < 0 and account.balance < -delta:
+            raise InsufficientBalance()
+        account.balance += delta
+        account.balance_version += 1
+    Account.objects.bulk_update(
+        accounts, ["balance", "balance_version"], batch_size=BULK_UPDATE_BATCH_SIZE
+    )
+    return [(account, changes[account.id]) for account in accounts]
+
+
+def transfer_between_users(sender_id, recipient_id, amount):
+    """Move ``amount`` from sender to recipient atomically.
+
+    Returns the sender's new balance, or None if the balance does not cover it.
+    """
+    try:
+        balances = apply_balance_changes(
+            {sender_id: -amount, recipient_id: amount}, kind=Kind.TRANSFER
+        )
+    except InsufficientBalance:
+        return None
+    return balances[sender_id]
+
+
+def transfer_to_users(sender_id, amounts):
+    """Move ``{recipient_id: amount}`` from sender to every recipient atomically.
+
+    Returns the sender's new balance, or None if the balance does not cover the
+    total.
+    """
+    changes = dict(amounts)
+    changes[sender_id] = -sum(amounts.values())
+    try:
+        balances = apply_balance_changes(changes, kind=Kind.TRANSFER)
+    except InsufficientBalance:
+        return None
+    return balances[sender_id]
+
+
+@retrying
+def _apply_to_bank(delta, *, kind, reference=""):
+    """Change the bank account's own balance, as a pending change only.
+
+    For deposits and withdrawals of the bank account itself, which would
+    otherwise change its row and its pending balance both. Returns the bank's
+    new balance; raises ``InsufficientBalance``.
+    """
+    bank_id = ledger.bank_account_id()
+    if delta < 0:
+        _check_bank_debit(bank_id, -delta)
+    aggregates.record_balance_changes(bank_delta=delta)
+    with ledger.journal(kind, reference) as journal:
+        journal.add_bank(delta)
+    balance = aggregates.bank_balance()
+    events.publish_balance(bank_id, balance)
+    return balance
+
+
+def credit_user_and_bank(user_id, amount, kind=Kind.DEPOSIT, reference=""):
+    """Credit user balance and bank assets atomically.
+
+    The bank's side is recorded as a pending change (see ``accounts.aggregates``)
+    instead of locking the bank account's row.
+    """
+    if user_id == ledger.bank_account_id():
+        return _apply_to_bank(amount, kind=kind, reference=reference)
+    return apply_balance_changes(
+        {user_id: amount}, kind=kind, bank_delta=amount, reference=reference
+    )[user_id]
+
+
+def debit_user_and_bank(user_id, amount, kind=Kind.WITHDRAW, reference=""):
+    """Debit user balance and bank assets atomically.
+
+    The bank's side is recorded as a pending change (see ``accounts.aggregates``)
+    instead of locking the bank account's row. Raises ``InsufficientBalance``.
+    """
+    if user_id == ledger.bank_account_id():
+        return _apply_to_bank(-amount, kind=kind, reference=reference)
+    return apply_balance_changes(
+        {user_id: -amount}, kind=kind, bank_delta=-amount, reference=reference
+    )[user_id]
+
+
+@retrying
+def credit_redeemed(user_id, amount, ys):
+    """Credit redeemed proofs and record them spent in one transaction."""
+    spent_proofs.spent_index.record(ys)
+    return credit_user_and_bank(user_id, amount, kind=Kind.REDEEM)
+
+
+@retrying
+def settle_deposit(payment_request_id):
+    """Credit a paid deposit and mark it paid in one transaction.
+
+    Expired deposits are credited too: the sweeper expires them without asking
+    the mint (see ``accounts.expiry``). Returns the account's new balance, or
+    None if the request was already settled.
+    """
+    payment_request = PaymentRequest.objects.select_for_update().get(
+        id=payment_request_id
+    )
+    if payment_request.status not in (
+        PaymentRequest.Status.PENDING,
+        PaymentRequest.Status.EXPIRED,
+    ):
+        return None
+
+    new_balance = credit_user_and_bank(
+        payment_request.account_id,
+        payment_request.amount,
+        reference=payment_request.quote_id,
+    )
+    payment_request.mark_paid()
+    events.publish_payment_request(payment_request)
+    return new_balance
+
+
+def expire_payment_request(payment_request):
+    """Mark a pending payment request expired and notify its account."""
+    with transaction.atomic():
+        payment_request.mark_expired()
+        events.publish_payment_request(payment_request)
@@ -9,13 +9,18 @@ urlpatterns = [
     path("create/", views.accounts_create, name="accounts_create"),
     path("login/", views.accounts_login, name="accounts_login"),
     path("me/", views.me, name="me"),
+    path("history/", views.history, name="history"),
     path("info/", views.info, name="info"),
     path("stats/", views.stats, name="stats"),
+    path("export/<str:dataset>/", views.export, name="export"),
     # Transaction endpoints
     path("send/user/", views.send_to_user, name="send_to_user"),
+    path("send/batch/", views.send_to_users_batch, name="send_to_users_batch"),
     path("withdraw/bearer/", views.withdraw_bearer, name="withdraw_bearer"),
     path("redeem/", views.redeem_bearer, name="redeem_bearer"),
+    path("redeem/batch/", views.redeem_bearer_batch, name="redeem_bearer_batch"),
     path("deposit/", views.deposit, name="deposit"),
     path("deposit/check/", views.check_deposit, name="check_deposit"),
     path("send/lightning/", views.send_to_lightning, name="send_to_lightning"),
+    path("events/", views.account_events, name="account_events"),
 ]
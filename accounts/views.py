@@ -1,75 +1,213 @@
+import asyncio
+import hashlib
 import json
 import os
 from datetime import timedelta
 
-import requests
-from asgiref.sync import sync_to_async
-from cashu.wallet.wallet import Wallet
+import httpx
 from cashu.wallet.helpers import receive as cashu_receive, deserialize_token_from_string
+from cashu.wallet.errors import BalanceTooLowError
+from django.conf import settings
 from django.contrib.auth import authenticate, login
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import transaction
-from django.db.models import Sum
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 
-from .models import Account, PaymentRequest
+from .db import in_db_thread
+from .events import event_broker
+from .mint_client import mint_client
+from . import (
+    aggregates,
+    balances,
+    events,
+    exports,
+    history as account_history,
+    ledger,
+    redemption,
+    spent_proofs,
+    transfers,
+)
+from .models import Account, LedgerEntry, PaymentRequest
+from .routers import replica_reads
+from .wallet import wallet_manager
 
 # Default invoice expiry in seconds (10 minutes)
 INVOICE_EXPIRY_SECONDS = 60
 
 
 @require_http_methods(["GET"])
-def info(request):
-    mint_url = os.environ["DJANGO_MINT_URL"]
+async def info(request):
     try:
-        response = requests.get(f"{mint_url}/v1/info")
-        response.raise_for_status()
-        return JsonResponse(response.json())
-    except requests.RequestException as e:
+        return JsonResponse(await mint_client.get_info())
+    except httpx.HTTPError as e:
         return JsonResponse({"error": str(e)}, status=500)
 
 
+ACCOUNT_LIST_FIELDS = ["id", "username", "balance", "is_staff", "date_joined"]
+ACCOUNT_LIST_DEFAULT_SIZE = 100
+ACCOUNT_LIST_MAX_SIZE = 1000
+
+
+def _int_param(params, name):
+    try:
+        return int(params[name])
+    except ValueError:
+        raise ValueError(f"{name} must be an integer") from None
+
+
+def _filter_accounts(params):
+    """Accounts matching ``is_staff``, ``min_balance``, ``max_balance`` and
+    ``username_prefix`` query parameters. Raises ValueError on bad values."""
+    accounts = Account.objects.order_by("id")
+    if params.get("is_staff"):
+        if params["is_staff"] not in ("true", "false"):
+            raise ValueError("is_staff must be true or false")
+        accounts = accounts.filter(is_staff=params["is_staff"] == "true")
+    if params.get("min_balance"):
+        accounts = accounts.filter(balance__gte=_int_param(params, "min_balance"))
+    if params.get("max_balance"):
+        accounts = accounts.filter(balance__lte=_int_param(params, "max_balance"))
+    if params.get("username_prefix"):
+        accounts = accounts.filter(username__startswith=params["username_prefix"])
+    if params.get("cursor"):
+        accounts = accounts.filter(id__gt=_int_param(params, "cursor"))
+    return accounts.values(*ACCOUNT_LIST_FIELDS)
+
+
+_bank_balance = in_db_thread(aggregates.bank_balance)
+
+
+async def _with_bank_balance(accounts):
+    # Include changes not folded into the bank account's row yet
+    for account in accounts:
+        if account["username"] == settings.DJANGO_BANK_WALLET:
+            account["balance"] = await _bank_balance()
+    return accounts
+
+
+async def _stream_accounts(accounts):
+    # Read chunk by chunk like exports, see accounts.exports
+    async for chunk in exports.achunks(accounts):
+        chunk = await _with_bank_balance(chunk)
+        yield "".join(
+            json.dumps(account, cls=DjangoJSONEncoder) + "\n" for account in chunk
+        )
+
+
 @require_http_methods(["GET"])
-def accounts_list(request):
-    """List all accounts (placeholder)."""
-    return JsonResponse({"accounts": [], "message": "Account list endpoint"})
+@replica_reads
+async def accounts_list(request):
+    """List accounts, for bank staff only.
+
+    Filters: ``is_staff``, ``min_balance``, ``max_balance``, ``username_prefix``.
+    Returns pages of ``limit`` accounts ordered by id; pass ``next_cursor`` as
+    ``cursor`` for the next page. With ``format=ndjson`` every matching account
+    is streamed as one JSON object per line instead.
+    """
+    user = await _get_logged_in_user_async(request)
+    if not user:
+        return JsonResponse({"error": "Not authenticated"}, status=401)
+    if not user.is_staff:
+        return JsonResponse({"error": "Forbidden"}, status=403)
+
+    try:
+        accounts = _filter_accounts(request.GET)
+        limit = ACCOUNT_LIST_DEFAULT_SIZE
+        if request.GET.get("limit"):
+            limit = _int_param(request.GET, "limit")
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    if request.GET.get("format") == "ndjson":
+        response = StreamingHttpResponse(
+            _stream_accounts(accounts), content_type="application/x-ndjson"
+        )
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+    if not 0 < limit <= ACCOUNT_LIST_MAX_SIZE:
+        return JsonResponse(
+            {"error": f"limit must be between 1 and {ACCOUNT_LIST_MAX_SIZE}"},
+            status=400,
+        )
+    page = [account async for account in accounts[: limit + 1]]
+    next_cursor = str(page[limit - 1]["id"]) if len(page) > limit else None
+    page = await _with_bank_balance(page[:limit])
+    return JsonResponse({"accounts": page, "next_cursor": next_cursor})
 
 
 @require_http_methods(["GET"])
-def stats(request):
-    """Get aggregate statistics for all accounts."""
-    # Exclude superuser from account count
-    total_accounts = Account.objects.filter(is_superuser=False).count()
+@replica_reads
+async def export(request, dataset):
+    """Stream an export of the ledger, payment requests or balances, staff only.
 
-    # Assets are balances of owned accounts (ecash coinbank holds)
-    total_assets = (
-        Account.objects.filter(is_staff=True).aggregate(total=Sum("balance"))["total"]
-        or 0
+    Query parameters: ``format`` (csv or ndjson), ``since``, ``until`` and
+    ``gzip=1``, see ``accounts.exports``.
+    """
+    user = await _get_logged_in_user_async(request)
+    if not user:
+        return JsonResponse({"error": "Not authenticated"}, status=401)
+    if not user.is_staff:
+        return JsonResponse({"error": "Forbidden"}, status=403)
+
+    if dataset not in exports.DATASETS:
+        return JsonResponse({"error": "Unknown dataset"}, status=404)
+    export_format = request.GET.get("format", exports.CSV)
+    if export_format not in exports.FORMATS:
+        return JsonResponse({"error": "format must be csv or ndjson"}, status=400)
+    compress = request.GET.get("gzip") in ("1", "true")
+    try:
+        since = exports.parse_bound(request.GET.get("since"))
+        until = exports.parse_bound(request.GET.get("until"))
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    encoder = exports.Encoder(dataset, export_format, compress=compress)
+    response = StreamingHttpResponse(
+        exports.aiter_export(exports.rows(dataset, since, until), encoder),
+        content_type=(
+            "application/gzip" if compress else exports.CONTENT_TYPES[export_format]
+        ),
     )
+    name = exports.filename(dataset, export_format, since, until, compress)
+    response["Content-Disposition"] = f'attachment; filename="{name}"'
+    response["X-Accel-Buffering"] = "no"
+    return response
 
-    # Liabilities are balances of non-owned accounts (what users hold)
-    total_liabilities = (
-        Account.objects.filter(is_staff=False).aggregate(total=Sum("balance"))["total"]
-        or 0
-    )
+
+@require_http_methods(["GET"])
+@replica_reads
+def stats(request):
+    """Get aggregate statistics for all accounts."""
+    # Maintained incrementally, see accounts.aggregates
+    totals = aggregates.totals()
+    total_accounts = totals[aggregates.Name.ACCOUNTS]
+    total_assets = totals[aggregates.Name.ASSETS]
+    total_liabilities = totals[aggregates.Name.LIABILITIES]
 
     # Get coin configuration from environment
     bank_name = os.environ["DJANGO_BANK_NAME"]
     coin_name = os.environ["DJANGO_COIN_NAME"]
     coin_symbol = os.environ["DJANGO_COIN_SYMBOL"]
 
-    return JsonResponse(
-        {
-            "total_accounts": total_accounts,
-            "total_assets": total_assets,
-            "total_liabilities": total_liabilities,
-            "coin_name": coin_name,
-            "coin_symbol": coin_symbol,
-            "bank_name": bank_name,
-        }
-    )
+    data = {
+        "total_accounts": total_accounts,
+        "total_assets": total_assets,
+        "total_liabilities": total_liabilities,
+        "coin_name": coin_name,
+        "coin_symbol": coin_symbol,
+        "bank_name": bank_name,
+    }
+    user = _get_logged_in_user(request)
+    if user and user.is_staff:
+        # Transfers of this worker retried after a deadlock or serialization
+        # failure, for bank staff only
+        data["transfer_retries"] = transfers.retry_counts()
+    return JsonResponse(data)
 
 
 @csrf_exempt
@@ -91,12 +229,14 @@ def accounts_create(request):
             return JsonResponse({"error": "Username already exists"}, status=400)
 
         # Create user using Django's create_user (handles password hashing)
-        user = Account.objects.create_user(
-            username=username,
-            password=password,
-            is_staff=False,  # New accounts are user accounts, not owned by bank
-            balance=0,
-        )
+        # Counted in the stats by accounts.aggregates, in the same transaction
+        with transaction.atomic():
+            user = Account.objects.create_user(
+                username=username,
+                password=password,
+                is_staff=False,  # New accounts are user accounts, not owned by bank
+                balance=0,
+            )
 
         return JsonResponse(
             {
@@ -129,6 +269,11 @@ def accounts_login(request):
         if user is not None:
             # Log the user in (creates session)
             login(request, user)
+            if user.username == settings.DJANGO_BANK_WALLET:
+                # Include changes not folded into the bank account's row yet
+                user.balance = aggregates.bank_balance()
+            else:
+                balances.store(user.id, user.balance, user.balance_version)
             bank_name = os.environ["DJANGO_BANK_NAME"]
             coin_name = os.environ["DJANGO_COIN_NAME"]
             coin_symbol = os.environ["DJANGO_COIN_SYMBOL"]
@@ -159,31 +304,135 @@ def _get_logged_in_user(request):
 
 
 @require_http_methods(["GET"])
+@replica_reads
 def me(request):
-    """Get current user's data including fresh balance."""
+    """Get current user's data including fresh balance.
+
+    The response has an ETag; polls with a matching ``If-None-Match`` get a 304.
+    """
     user = _get_logged_in_user(request)
     if not user:
         return JsonResponse({"error": "Not authenticated"}, status=401)
 
-    # Refresh from database to get current balance
-    user.refresh_from_db()
+    # The user comes from the cache, and so does the balance with a shared
+    # cache, see accounts.auth and accounts.balances
+    if user.username == settings.DJANGO_BANK_WALLET:
+        # Include changes not folded into the bank account's row yet
+        balance = aggregates.bank_balance()
+    else:
+        _, balance = balances.current(user.id)
 
     bank_name = os.environ["DJANGO_BANK_NAME"]
     coin_name = os.environ["DJANGO_COIN_NAME"]
     coin_symbol = os.environ["DJANGO_COIN_SYMBOL"]
 
-    return JsonResponse(
-        {
-            "user_id": user.id,
-            "username": user.username,
-            "balance": user.balance,
-            "bank_name": bank_name,
-            "coin_name": coin_name,
-            "coin_symbol": coin_symbol,
-            "is_staff": user.is_staff,
-            "is_superuser": user.is_superuser,
-        }
-    )
+    data = {
+        "user_id": user.id,
+        "username": user.username,
+        "balance": balance,
+        "bank_name": bank_name,
+        "coin_name": coin_name,
+        "coin_symbol": coin_symbol,
+        "is_staff": user.is_staff,
+        "is_superuser": user.is_superuser,
+    }
+    body = json.dumps(data).encode()
+    etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse(data)
+    response["ETag"] = etag
+    # Clients may keep it, but must check it is still current
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@require_http_methods(["GET"])
+@replica_reads
+def history(request):
+    """Get a page of the current user's history, newest first.
+
+    ``source=ledger`` (default) lists balance changes and can be filtered by
+    ``type`` (ledger entry kind). ``source=payments`` lists deposit/withdraw
+    invoices and can be filtered by ``type`` and ``status``;
+    ``source=archived_payments`` lists invoices that were archived. Pass the returned
+    ``next_cursor`` as ``cursor`` to get the next page.
+    """
+    user = _get_logged_in_user(request)
+    if not user:
+        return JsonResponse({"error": "Not authenticated"}, status=401)
+
+    source = request.GET.get("source", account_history.LEDGER)
+    entry_type = request.GET.get("type") or None
+    status = request.GET.get("status") or None
+    cursor = request.GET.get("cursor") or None
+    try:
+        limit = int(request.GET.get("limit", account_history.DEFAULT_PAGE_SIZE))
+    except ValueError:
+        return JsonResponse({"error": "Invalid limit"}, status=400)
+    if not 0 < limit <= account_history.MAX_PAGE_SIZE:
+        return JsonResponse(
+            {"error": f"limit must be between 1 and {account_history.MAX_PAGE_SIZE}"},
+            status=400,
+        )
+
+    try:
+        if source == account_history.LEDGER:
+            if entry_type and entry_type not in LedgerEntry.Kind.values:
+                return JsonResponse({"error": "Invalid type"}, status=400)
+            if status:
+                return JsonResponse(
+                    {"error": "status does not apply to source=ledger"}, status=400
+                )
+            rows, next_cursor = account_history.ledger_page(
+                user.id, kind=entry_type, cursor=cursor, limit=limit
+            )
+            results = [
+                {
+                    "id": row["id"],
+                    "txn_id": row["txn_id"],
+                    "type": row["kind"],
+                    "amount": row["amount"],
+                    "reference": row["reference"],
+                    "created_at": row["created_at"],
+                }
+                for row in rows
+            ]
+        elif source in (account_history.PAYMENTS, account_history.ARCHIVED_PAYMENTS):
+            if entry_type and entry_type not in PaymentRequest.RequestType.values:
+                return JsonResponse({"error": "Invalid type"}, status=400)
+            if status and status not in PaymentRequest.Status.values:
+                return JsonResponse({"error": "Invalid status"}, status=400)
+            rows, next_cursor = account_history.payments_page(
+                user.id,
+                request_type=entry_type,
+                status=status,
+                cursor=cursor,
+                limit=limit,
+                archived=source == account_history.ARCHIVED_PAYMENTS,
+            )
+            results = [
+                {
+                    "id": row["id"],
+                    "type": row["request_type"],
+                    "amount": row["amount"],
+                    "status": row["status"],
+                    "quote_id": row["quote_id"],
+                    "created_at": row["created_at"],
+                    "expires_at": row["expires_at"],
+                    "paid_at": row["paid_at"],
+                }
+                for row in rows
+            ]
+        else:
+            return JsonResponse(
+                {"error": "source must be ledger, payments or archived_payments"},
+                status=400,
+            )
+    except account_history.InvalidCursor as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    return JsonResponse({"results": results, "next_cursor": next_cursor})
 
 
 @csrf_exempt
@@ -208,7 +457,7 @@ def send_to_user(request):
         if amount <= 0:
             return JsonResponse({"error": "Amount must be positive"}, status=400)
 
-        if amount > user.balance:
+        if not balances.covers(user.id, amount):
             return JsonResponse({"error": "Insufficient balance"}, status=400)
 
         try:
@@ -220,23 +469,15 @@ def send_to_user(request):
             return JsonResponse({"error": "Cannot send to yourself"}, status=400)
 
         # Atomic transfer
-        with transaction.atomic():
-            sender = Account.objects.select_for_update().get(id=user.id)
-            recipient = Account.objects.select_for_update().get(id=recipient.id)
-
-            if sender.balance < amount:
-                return JsonResponse({"error": "Insufficient balance"}, status=400)
-
-            sender.balance -= amount
-            recipient.balance += amount
-            sender.save()
-            recipient.save()
+        new_balance = transfers.transfer_between_users(user.id, recipient.id, amount)
+        if new_balance is None:
+            return JsonResponse({"error": "Insufficient balance"}, status=400)
 
         return JsonResponse(
             {
                 "success": True,
                 "message": f"Sent {amount} to {recipient_username}",
-                "new_balance": sender.balance,
+                "new_balance": new_balance,
             }
         )
     except json.JSONDecodeError:
@@ -245,24 +486,99 @@ def send_to_user(request):
         return JsonResponse({"error": "Invalid amount"}, status=400)
 
 
-async def _load_wallet():
-    """Helper to load the cashu wallet."""
-    cashu_dir = os.environ["DJANGO_BANK_WALLET_CASHU_DIR"]
-    db_path = os.path.join(cashu_dir, os.environ["DJANGO_BANK_WALLET"])
+@csrf_exempt
+@require_http_methods(["POST"])
+def send_to_users_batch(request):
+    """Send coins to many bank users in one transaction.
 
-    wallet = await Wallet.with_db(
-        url=os.environ["DJANGO_MINT_URL"],
-        db=db_path,
-        name=os.environ["DJANGO_BANK_WALLET"],
-        unit="sat",
+    Takes ``{"transfers": [{"recipient_username": ..., "amount": ...}, ...]}``.
+    Either every transfer is made or none is; ``results`` has one entry per
+    transfer, in order.
+    """
+    user = _get_logged_in_user(request)
+    if not user:
+        return JsonResponse({"error": "Not authenticated"}, status=401)
+
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+
+    entries = data.get("transfers") if isinstance(data, dict) else None
+    if not isinstance(entries, list) or not entries:
+        return JsonResponse({"error": "transfers is required"}, status=400)
+    if len(entries) > settings.DJANGO_TRANSFER_BATCH_MAX_SIZE:
+        return JsonResponse(
+            {
+                "error": f"At most {settings.DJANGO_TRANSFER_BATCH_MAX_SIZE} transfers per batch"
+            },
+            status=400,
+        )
+
+    # Resolve every recipient in one query
+    usernames = {
+        entry.get("recipient_username") for entry in entries if isinstance(entry, dict)
+    }
+    recipient_ids = dict(
+        Account.objects.filter(username__in=usernames - {None}).values_list(
+            "username", "id"
+        )
     )
-    # Always load mint info and keysets
-    await wallet.load_mint()
 
-    return wallet
+    results = []
+    amounts = {}
+    for entry in entries:
+        if not isinstance(entry, dict):
+            entry = {}
+        recipient_username = entry.get("recipient_username")
+        amount = entry.get("amount")
+        result = {"recipient_username": recipient_username, "amount": amount}
+        results.append(result)
+        try:
+            amount = int(amount)
+        except (TypeError, ValueError):
+            result["error"] = "Invalid amount"
+            continue
+        if amount <= 0:
+            result["error"] = "Amount must be positive"
+        elif recipient_username not in recipient_ids:
+            result["error"] = "Recipient not found"
+        elif recipient_ids[recipient_username] == user.id:
+            result["error"] = "Cannot send to yourself"
+        else:
+            recipient_id = recipient_ids[recipient_username]
+            amounts[recipient_id] = amounts.get(recipient_id, 0) + amount
+            result["amount"] = amount
+
+    if any("error" in result for result in results):
+        for result in results:
+            result["success"] = False
+        return JsonResponse(
+            {
+                "error": "Some transfers are invalid, nothing was sent",
+                "results": results,
+            },
+            status=400,
+        )
+
+    total = sum(amounts.values())
+    new_balance = transfers.transfer_to_users(user.id, amounts)
+    if new_balance is None:
+        return JsonResponse({"error": "Insufficient balance"}, status=400)
 
+    for result in results:
+        result["success"] = True
+    return JsonResponse(
+        {
+            "success": True,
+            "message": f"Sent {total} to {len(amounts)} recipients",
+            "new_balance": new_balance,
+            "results": results,
+        }
+    )
 
-@sync_to_async
+
+@in_db_thread
 def _get_logged_in_user_async(request):
     """Async helper to get the logged-in user from session."""
     if not request.user.is_authenticated:
@@ -270,26 +586,8 @@ def _get_logged_in_user_async(request):
     return request.user
 
 
-@sync_to_async
-def _debit_user_and_bank(user_id, amount):
-    """Debit user balance and bank assets atomically."""
-    bank_username = os.environ["DJANGO_BANK_WALLET"]
-
-    with transaction.atomic():
-        account = Account.objects.select_for_update().get(id=user_id)
-        if account.balance < amount:
-            raise ValueError("Insufficient balance")
-
-        try:
-            bank = Account.objects.select_for_update().get(username=bank_username)
-            bank.balance -= amount
-            bank.save()
-        except Account.DoesNotExist:
-            pass  # No bank account
-
-        account.balance -= amount
-        account.save()
-        return account.balance
+_debit_user_and_bank = in_db_thread(transfers.debit_user_and_bank)
+_covers = in_db_thread(balances.covers)
 
 
 @csrf_exempt
@@ -311,47 +609,16 @@ async def withdraw_bearer(request):
         if amount <= 0:
             return JsonResponse({"error": "Amount must be positive"}, status=400)
 
-        if amount > user.balance:
+        if not await _covers(user.id, amount):
             return JsonResponse({"error": "Insufficient balance"}, status=400)
 
-        # Load wallet and create token
-        wallet = await _load_wallet()
-
-        # Load proofs from wallet database
-        await wallet.load_proofs()
-
-        # Check wallet has enough balance
-        wallet_balance = wallet.available_balance
-        if wallet_balance.amount < amount:
-            return JsonResponse(
-                {
-                    "error": f"Insufficient wallet balance ({wallet_balance.amount} < {amount})"
-                },
-                status=500,
-            )
-
-        # Select proofs to send (this may do a swap with the mint if needed)
-        send_proofs, fees = await wallet.select_to_send(
-            wallet.proofs, amount, set_reserved=True
-        )
-
-        if not send_proofs:
-            return JsonResponse(
-                {"error": "Could not select proofs for amount"}, status=500
-            )
-
-        # Serialize proofs to a token string
-        token = await wallet.serialize_proofs(send_proofs)
-
-        if not token:
-            return JsonResponse({"error": "Failed to generate token"}, status=500)
-
-        # Invalidate the sent proofs from the wallet
-        await wallet.invalidate(send_proofs)
-
-        # Deduct from user balance atomically
+        # Take proofs from the bank wallet and create token; the proofs are
+        # only spent if the debit succeeds
         try:
-            new_balance = await _debit_user_and_bank(user.id, amount)
+            async with wallet_manager.send_token(amount) as token:
+                new_balance = await _debit_user_and_bank(user.id, amount)
+        except BalanceTooLowError:
+            return JsonResponse({"error": "Insufficient wallet balance"}, status=500)
         except ValueError as e:
             return JsonResponse({"error": str(e)}, status=400)
 
@@ -386,25 +653,41 @@ async def redeem_bearer(request):
         if not token:
             return JsonResponse({"error": "token is required"}, status=400)
 
-        # Load wallet and receive token
-        wallet = await _load_wallet()
-
         try:
             # Deserialize and receive the token using cashu helpers
             token_obj = deserialize_token_from_string(token)
             # Get the amount from the token proofs
             amount = sum(p.amount for p in token_obj.proofs)
+        except Exception as e:
+            return JsonResponse({"error": f"Invalid token: {str(e)}"}, status=400)
 
-            # Receive the token (redeem it into wallet)
-            await cashu_receive(wallet, token_obj)
+        ys = [p.Y for p in token_obj.proofs]
+        if await spent_proofs.spent(ys):
+            # Replayed token, no need to ask the mint
+            return JsonResponse({"error": "Token already spent"}, status=400)
+
+        try:
+            # Receive the token (redeem it into the shared wallet)
+            async with wallet_manager.borrow(exclusive=True) as wallet:
+                if token_obj.mint == wallet.url:
+                    # Mint and keysets are already loaded, swap directly
+                    try:
+                        await wallet.redeem(token_obj.proofs)
+                    except Exception:
+                        await redemption.record_failed(wallet, token_obj.proofs)
+                        raise
+                else:
+                    await cashu_receive(wallet, token_obj)
         except Exception as e:
             return JsonResponse({"error": f"Invalid token: {str(e)}"}, status=400)
 
         if not amount or amount <= 0:
+            await spent_proofs.record(ys)
             return JsonResponse({"error": "Invalid token"}, status=400)
 
-        # Credit user and bank
-        new_balance = await _credit_user_and_bank(user.id, amount)
+        # Credit user and bank, with the proofs recorded spent in the same
+        # transaction
+        new_balance = await _credit_redeemed(user.id, amount, ys)
 
         return JsonResponse(
             {
@@ -420,7 +703,63 @@ async def redeem_bearer(request):
         return JsonResponse({"error": f"Redeem failed: {str(e)}"}, status=500)
 
 
-@sync_to_async
+@csrf_exempt
+@require_http_methods(["POST"])
+async def redeem_bearer_batch(request):
+    """Redeem many bearer tokens and credit their total once.
+
+    Takes ``{"tokens": [...]}``. Tokens that can't be redeemed (spent, invalid)
+    don't stop the others; ``results`` has one entry per token, in order.
+    """
+    user = await _get_logged_in_user_async(request)
+    if not user:
+        return JsonResponse({"error": "Not authenticated"}, status=401)
+
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+
+    tokens = data.get("tokens") if isinstance(data, dict) else None
+    if not isinstance(tokens, list) or not tokens:
+        return JsonResponse({"error": "tokens is required"}, status=400)
+    if len(tokens) > settings.DJANGO_REDEEM_BATCH_MAX_SIZE:
+        return JsonResponse(
+            {
+                "error": f"At most {settings.DJANGO_REDEEM_BATCH_MAX_SIZE} tokens per batch"
+            },
+            status=400,
+        )
+
+    try:
+        results = await redemption.redeem_tokens(tokens)
+    except Exception as e:
+        return JsonResponse({"error": f"Redeem failed: {str(e)}"}, status=500)
+
+    for result in results:
+        result["success"] = "error" not in result
+    amount = sum(result["amount"] for result in results if result["success"])
+    if not amount:
+        return JsonResponse(
+            {"error": "No token could be redeemed", "results": results}, status=400
+        )
+
+    new_balance = await _credit_user_and_bank(
+        user.id, amount, kind=transfers.Kind.REDEEM
+    )
+    redeemed = sum(result["success"] for result in results)
+    return JsonResponse(
+        {
+            "success": True,
+            "message": f"Redeemed {amount} from {redeemed} tokens",
+            "amount": amount,
+            "new_balance": new_balance,
+            "results": results,
+        }
+    )
+
+
+@in_db_thread
 def _create_payment_request(user, amount, quote_id, invoice, request_type, expires_at):
     """Create a PaymentRequest record in the database."""
     return PaymentRequest.objects.create(
@@ -433,7 +772,7 @@ def _create_payment_request(user, amount, quote_id, invoice, request_type, expir
     )
 
 
-@sync_to_async
+@in_db_thread
 def _get_payment_request(quote_id):
     """Get a PaymentRequest by quote_id."""
     try:
@@ -442,35 +781,17 @@ def _get_payment_request(quote_id):
         return None
 
 
-@sync_to_async
-def _credit_user_and_bank(user_id, amount):
-    """Credit user balance and bank assets atomically."""
-    bank_username = os.environ["DJANGO_BANK_WALLET"]
-
-    with transaction.atomic():
-        account = Account.objects.select_for_update().get(id=user_id)
-        try:
-            bank = Account.objects.select_for_update().get(username=bank_username)
-            bank.balance += amount
-            bank.save()
-        except Account.DoesNotExist:
-            pass  # No bank account, just credit user
-
-        account.balance += amount
-        account.save()
-        return account.balance
-
-
-@sync_to_async
-def _mark_payment_paid(payment_request):
-    """Mark a payment request as paid."""
-    payment_request.mark_paid()
+_credit_user_and_bank = in_db_thread(transfers.credit_user_and_bank)
+_credit_redeemed = in_db_thread(transfers.credit_redeemed)
 
 
-@sync_to_async
-def _mark_payment_expired(payment_request):
-    """Mark a payment request as expired."""
-    payment_request.mark_expired()
+@in_db_thread
+def _get_balance(user_id):
+    """Read an account's current balance."""
+    if user_id == ledger.bank_account_id():
+        # Include changes not folded into the bank account's row yet
+        return aggregates.bank_balance()
+    return Account.objects.values_list("balance", flat=True).get(id=user_id)
 
 
 @csrf_exempt
@@ -492,15 +813,15 @@ async def deposit(request):
         if amount <= 0:
             return JsonResponse({"error": "Amount must be positive"}, status=400)
 
-        # Load wallet and create mint quote (invoice)
-        wallet = await _load_wallet()
-        mint_quote = await wallet.request_mint(amount)
+        # Create mint quote (invoice) with the shared wallet
+        async with wallet_manager.borrow() as wallet:
+            mint_quote = await wallet.request_mint(amount)
 
         # Calculate expiry time
         expires_at = timezone.now() + timedelta(seconds=INVOICE_EXPIRY_SECONDS)
 
         # Store payment request in database
-        payment_request = await _create_payment_request(
+        await _create_payment_request(
             user=user,
             amount=amount,
             quote_id=mint_quote.quote,
@@ -531,7 +852,7 @@ async def deposit(request):
 @csrf_exempt
 @require_http_methods(["POST"])
 async def check_deposit(request):
-    """Check if a deposit invoice has been paid and credit the user."""
+    """Check whether a deposit invoice has been paid and credited."""
     user = await _get_logged_in_user_async(request)
     if not user:
         return JsonResponse({"error": "Not authenticated"}, status=401)
@@ -552,30 +873,22 @@ async def check_deposit(request):
         if payment_request.account_id != user.id:
             return JsonResponse({"error": "Not authorized"}, status=403)
 
-        # Check if already processed
+        # Deposits are credited by the settlement worker (see settledeposits),
+        # here we only report the stored status
         if payment_request.status == PaymentRequest.Status.PAID:
             return JsonResponse(
                 {
                     "success": True,
                     "paid": True,
                     "amount": payment_request.amount,
-                    "message": "Already credited",
-                }
-            )
-
-        if payment_request.status == PaymentRequest.Status.EXPIRED:
-            return JsonResponse(
-                {
-                    "success": True,
-                    "paid": False,
-                    "expired": True,
-                    "message": "Invoice expired",
+                    "new_balance": await _get_balance(user.id),
                 }
             )
 
-        # Check if expired
-        if payment_request.is_expired:
-            await _mark_payment_expired(payment_request)
+        if payment_request.status in (
+            PaymentRequest.Status.EXPIRED,
+            PaymentRequest.Status.FAILED,
+        ):
             return JsonResponse(
                 {
                     "success": True,
@@ -585,51 +898,13 @@ async def check_deposit(request):
                 }
             )
 
-        # Load wallet and try to mint - this checks payment and mints in one call
-        wallet = await _load_wallet()
-
-        try:
-            # wallet.mint() will succeed if invoice is paid, raise exception if not
-            proofs = await wallet.mint(payment_request.amount, quote_id=quote_id)
-
-            # If we get here, payment was successful - credit user and bank
-            new_balance = await _credit_user_and_bank(user.id, payment_request.amount)
-
-            # Mark as paid
-            await _mark_payment_paid(payment_request)
-
-            return JsonResponse(
-                {
-                    "success": True,
-                    "paid": True,
-                    "amount": payment_request.amount,
-                    "new_balance": new_balance,
-                }
-            )
-        except Exception as e:
-            # Invoice not paid yet (or other error)
-            error_msg = str(e).lower()
-            if (
-                "not paid" in error_msg
-                or "pending" in error_msg
-                or "unpaid" in error_msg
-            ):
-                return JsonResponse(
-                    {
-                        "success": True,
-                        "paid": False,
-                        "expired": False,
-                    }
-                )
-            # Some other error
-            return JsonResponse(
-                {
-                    "success": True,
-                    "paid": False,
-                    "expired": False,
-                    "debug": str(e),
-                }
-            )
+        return JsonResponse(
+            {
+                "success": True,
+                "paid": False,
+                "expired": False,
+            }
+        )
 
     except json.JSONDecodeError:
         return JsonResponse({"error": "Invalid JSON"}, status=400)
@@ -660,24 +935,26 @@ async def send_to_lightning(request):
         if amount <= 0:
             return JsonResponse({"error": "Amount must be positive"}, status=400)
 
-        if amount > user.balance:
+        if not await _covers(user.id, amount):
             return JsonResponse({"error": "Insufficient balance"}, status=400)
 
         # Mock: Just debit user and bank without actually paying the invoice
         # TODO: Uncomment below to use real Lightning payment via mint:
-        # wallet = await _load_wallet()
-        # await wallet.load_proofs()
-        # wallet_balance = wallet.available_balance
-        # if wallet_balance < amount:
-        #     return JsonResponse({"error": f"Insufficient bank reserves"}, status=500)
-        # melt_quote = await wallet.melt_quote(invoice)
-        # total_amount = melt_quote.amount + melt_quote.fee_reserve
-        # send_proofs, fees = await wallet.select_to_send(wallet.proofs, total_amount, set_reserved=True)
-        # melt_response = await wallet.melt(send_proofs, invoice, melt_quote.fee_reserve, melt_quote.quote)
+        # async with wallet_manager.borrow(exclusive=True) as wallet:
+        #     await wallet.load_proofs(reload=True)
+        #     wallet_balance = wallet.available_balance
+        #     if wallet_balance < amount:
+        #         return JsonResponse({"error": f"Insufficient bank reserves"}, status=500)
+        #     melt_quote = await wallet.melt_quote(invoice)
+        #     total_amount = melt_quote.amount + melt_quote.fee_reserve
+        #     send_proofs, fees = await wallet.select_to_send(wallet.proofs, total_amount, set_reserved=True)
+        #     melt_response = await wallet.melt(send_proofs, invoice, melt_quote.fee_reserve, melt_quote.quote)
 
         # Debit user and bank
         try:
-            new_balance = await _debit_user_and_bank(user.id, amount)
+            new_balance = await _debit_user_and_bank(
+                user.id, amount, kind=transfers.Kind.LIGHTNING
+            )
         except ValueError as e:
             return JsonResponse({"error": str(e)}, status=400)
 
@@ -695,3 +972,46 @@ async def send_to_lightning(request):
         return JsonResponse({"error": "Invalid amount"}, status=400)
     except Exception as e:
         return JsonResponse({"error": f"Send failed: {str(e)}"}, status=500)
+
+
+def _format_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _event_stream(account_id):
+    async with event_broker.subscribe(account_id) as queue:
+        # With the local backend settled and expired invoices are never sent
+        # here, so clients keep polling for them at full speed
+        yield _format_event(events.STREAM, {"cross_process": events.cross_process()})
+        # Then the current balance so clients don't need to poll /me/
+        balance = await _get_balance(account_id)
+        yield _format_event(events.BALANCE, {"balance": balance})
+        while True:
+            try:
+                event, data = await asyncio.wait_for(
+                    queue.get(), timeout=settings.DJANGO_EVENTS_KEEPALIVE_SECONDS
+                )
+            except asyncio.TimeoutError:
+                # Comment line keeps proxies from closing an idle connection
+                yield ": keepalive\n\n"
+                continue
+            yield _format_event(event, data)
+
+
+@require_http_methods(["GET"])
+async def account_events(request):
+    """Stream balance and payment request updates as Server-Sent Events."""
+    user = await _get_logged_in_user_async(request)
+    if not user:
+        return JsonResponse({"error": "Not authenticated"}, status=401)
+    if not event_broker.started:
+        # Not served by coinbank.asgi (e.g. runserver): nothing would ever be
+        # sent, make clients fall back to polling instead of holding a thread
+        return JsonResponse({"error": "Events are not available"}, status=503)
+
+    response = StreamingHttpResponse(
+        _event_stream(user.id), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
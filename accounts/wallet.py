@@ -0,0 +1,455 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from contextlib import asynccontextmanager
+
+from cashu.core.split import amount_split
+from cashu.wallet.errors import BalanceTooLowError
+from cashu.wallet.wallet import Wallet
+from django.conf import settings
+
+from . import mint_cache, spent_proofs
+from .proof_inventory import ProofInventory
+from .rebalancer import Rebalancer
+
+logger = logging.getLogger(__name__)
+
+
+class BankWallet(Wallet):
+    """Cashu wallet whose change can be steered into chosen denominations.
+
+    While ``wanted_amounts`` (``{amount: count}``) is set, the proofs a mint or
+    swap keeps are split into those amounts first, smallest first, and the rest
+    as usual. Otherwise cashu's default applies (a few proofs of every amount).
+    """
+
+    wanted_amounts = None
+
+    def split_wallet_state(self, amount):
+        if self.wanted_amounts is None:
+            return super().split_wallet_state(amount)
+        amounts = []
+        remaining = amount
+        for denomination in sorted(self.wanted_amounts):
+            for _ in range(self.wanted_amounts[denomination]):
+                if denomination > remaining:
+                    break
+                amounts.append(denomination)
+                remaining -= denomination
+        return sorted(amounts + amount_split(remaining))
+
+
+async def load_wallet():
+    """Open the bank's cashu wallet and load mint info and keysets.
+
+    Keysets are read from the wallet DB when the on-disk mint cache is fresh,
+    otherwise they are loaded from the mint and the cache is updated.
+    """
+    cashu_dir = settings.DJANGO_BANK_WALLET_CASHU_DIR
+    db_path = os.path.join(cashu_dir, settings.DJANGO_BANK_WALLET)
+
+    wallet = await BankWallet.with_db(
+        url=settings.DJANGO_MINT_URL,
+        db=db_path,
+        name=settings.DJANGO_BANK_WALLET,
+        unit="sat",
+    )
+
+    cached = mint_cache.get_keysets()
+    if cached and cached["active_keyset_id"] in wallet.keysets:
+        try:
+            await wallet.activate_keyset(cached["active_keyset_id"])
+            return wallet
+        except Exception as e:
+            logger.warning("Cached keyset not usable, loading from mint: %s", e)
+
+    await wallet.load_mint()
+    if getattr(wallet, "keyset_id", None):
+        mint_cache.store_keysets(wallet)
+
+    return wallet
+
+
+class _ReadWriteLock:
+    """asyncio lock held either by many shared holders or by one exclusive holder.
+
+    Waiting exclusive holders block new shared holders so writers are not starved.
+    """
+
+    def __init__(self):
+        self._condition = asyncio.Condition()
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @property
+    def busy(self):
+        return bool(self._readers or self._writer or self._writers_waiting)
+
+    @asynccontextmanager
+    async def shared(self):
+        async with self._condition:
+            await self._condition.wait_for(
+                lambda: not self._writer and not self._writers_waiting
+            )
+            self._readers += 1
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self._readers -= 1
+                self._condition.notify_all()
+
+    @asynccontextmanager
+    async def exclusive(self):
+        async with self._condition:
+            self._writers_waiting += 1
+            try:
+                await self._condition.wait_for(
+                    lambda: not self._writer and not self._readers
+                )
+            finally:
+                self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self._writer = False
+                self._condition.notify_all()
+
+
+class WalletManager:
+    """Keeps one warm cashu wallet per worker process.
+
+    The wallet is opened once on the event loop that serves requests (see
+    ``coinbank.asgi``) and its keysets are refreshed in the background. Views
+    borrow it with ``async with wallet_manager.borrow() as wallet``; operations
+    that touch proofs or secret counters (mint, swap, send) must pass
+    ``exclusive=True``, quote requests can share the wallet.
+
+    Callers on any other event loop (e.g. async views run under WSGI, where every
+    request gets its own loop) get a freshly loaded wallet instead, since the
+    wallet's HTTP client and DB engine are bound to the loop that created them.
+
+    The wallet's spendable proofs are kept in a ``ProofInventory`` instead of
+    ``wallet.proofs``: proofs the wallet creates while borrowed exclusively are
+    moved there when it is returned, and ``send_token()`` takes proofs from it.
+    The denominations withdrawals need are kept in stock by swapping surplus
+    proofs for them while the wallet is idle (see ``accounts.rebalancer``).
+    """
+
+    # Attempts to claim exactly matching proofs before swapping for them
+    CLAIM_ATTEMPTS = 3
+
+    def __init__(self):
+        self.wallet = None
+        self.inventory = ProofInventory()
+        self.rebalancer = Rebalancer()
+        self._loop = None
+        self._lock = None
+        self._starting = None
+        self._refresh_task = None
+        self._reload_task = None
+        self._rebalance_task = None
+
+    @property
+    def started(self):
+        return self.wallet is not None
+
+    async def start(self):
+        """Open the wallet and start the background refresh (idempotent)."""
+        if self._starting is None:
+            self._starting = asyncio.ensure_future(self._start())
+        try:
+            await asyncio.shield(self._starting)
+        except Exception:
+            self._starting = None
+            raise
+
+    async def _start(self):
+        self._lock = _ReadWriteLock()
+        wallet = await load_wallet()
+        await self._reload_inventory(wallet)
+        self.wallet = wallet
+        self._loop = asyncio.get_running_loop()
+        self._refresh_task = asyncio.create_task(self._refresh_forever())
+        self._reload_task = asyncio.create_task(self._reload_inventory_forever())
+        self._rebalance_task = asyncio.create_task(self._rebalance_forever())
+        logger.info("Bank wallet loaded for %s", self.wallet.url)
+
+    async def stop(self):
+        for task in (self._refresh_task, self._reload_task, self._rebalance_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self.wallet = None
+        self.inventory = ProofInventory()
+        self._loop = None
+        self._lock = None
+        self._starting = None
+        self._refresh_task = None
+        self._reload_task = None
+        self._rebalance_task = None
+
+    async def refresh(self):
+        """Reload keysets from the mint if they changed. Returns True if reloaded."""
+        wallet = self.wallet
+        if getattr(wallet, "keyset_id", None):
+            # Cheap keyset listing outside the lock; only reload on changes
+            mint_keysets = await wallet._get_keysets()
+            if all(
+                k.id in wallet.keysets
+                and wallet.keysets[k.id].active == k.active
+                and wallet.keysets[k.id].input_fee_ppk == (k.input_fee_ppk or 0)
+                for k in mint_keysets
+                if k.unit == wallet.unit.name
+            ):
+                mint_cache.store_keysets(wallet)
+                return False
+
+        async with self._lock.exclusive():
+            await wallet.load_mint()
+            if getattr(wallet, "keyset_id", None):
+                mint_cache.store_keysets(wallet)
+        return True
+
+    async def _refresh_forever(self):
+        while True:
+            await asyncio.sleep(settings.DJANGO_BANK_WALLET_REFRESH_SECONDS)
+            try:
+                if await self.refresh():
+                    logger.info("Reloaded mint keysets")
+            except Exception:
+                logger.exception("Could not refresh mint keysets")
+
+    async def _reload_inventory(self, wallet):
+        # Proofs reserved in the wallet DB (including the ones taken from this
+        # inventory) are skipped, so taken proofs stay taken
+        await wallet.load_proofs(reload=True)
+        self.inventory.load(wallet.proofs)
+        wallet.proofs = []
+
+    async def _reload_inventory_forever(self):
+        while True:
+            await asyncio.sleep(settings.DJANGO_PROOF_INVENTORY_RELOAD_SECONDS)
+            try:
+                async with self._lock.exclusive():
+                    await self._reload_inventory(self.wallet)
+            except Exception:
+                logger.exception("Could not reload proof inventory")
+
+    def _deficits(self, wallet):
+        counts = self.inventory.counts(self._spendable_keysets(wallet))
+        return self.rebalancer.deficits(counts)
+
+    async def rebalance(self):
+        """Swap surplus proofs for denominations short of their targets.
+
+        Returns the number of proofs swapped.
+        """
+        async with self.borrow(exclusive=True) as wallet:
+            wanted = self._deficits(wallet)
+            if not wanted:
+                return 0
+            value = sum(amount * count for amount, count in wanted.items())
+            inputs = self.inventory.take_surplus(
+                value,
+                self._spendable_keysets(wallet),
+                self.rebalancer.targets(),
+                fees=wallet.get_fees_for_proofs,
+                limit=settings.DJANGO_REBALANCE_MAX_INPUTS,
+            )
+            if inputs is None:
+                return 0
+            if sum(p.amount for p in inputs) <= wallet.get_fees_for_proofs(inputs):
+                self.inventory.put_back(inputs)
+                return 0
+            if not await self._claim(wallet, inputs):
+                return 0
+            wallet.wanted_amounts = wanted
+            try:
+                await wallet.split(inputs, 0)
+            except Exception:
+                await self._release(wallet, inputs)
+                raise
+            finally:
+                wallet.wanted_amounts = None
+            self.inventory.forget(inputs)
+            await spent_proofs.record(p.Y for p in inputs)
+            return len(inputs)
+
+    async def _rebalance_forever(self):
+        while True:
+            await asyncio.sleep(settings.DJANGO_REBALANCE_INTERVAL_SECONDS)
+            if self._lock.busy:
+                continue  # Don't hold up withdrawals, try again when idle
+            try:
+                swapped = await self.rebalance()
+                if swapped:
+                    logger.info("Rebalanced %s proofs", swapped)
+            except Exception:
+                logger.exception("Could not rebalance proofs")
+
+    @asynccontextmanager
+    async def borrow(self, exclusive=False):
+        """Borrow the shared wallet for the duration of the ``async with`` block."""
+        if not self.started or asyncio.get_running_loop() is not self._loop:
+            yield await load_wallet()
+            return
+
+        if not getattr(self.wallet, "keyset_id", None):
+            # Mint was unreachable when the wallet was loaded, try again now
+            await self.refresh()
+
+        if not exclusive:
+            async with self._lock.shared():
+                yield self.wallet
+            return
+
+        async with self._lock.exclusive():
+            try:
+                yield self.wallet
+            finally:
+                # Proofs minted, redeemed or swapped for go to the inventory
+                self.inventory.add(self.wallet.proofs)
+                self.wallet.proofs = []
+
+    def _spendable_keysets(self, wallet):
+        return {
+            keyset_id
+            for keyset_id, keyset in wallet.keysets.items()
+            if keyset.unit == wallet.unit
+        }
+
+    async def _claim(self, wallet, proofs):
+        """Reserve taken proofs in the wallet DB. Returns False if any was gone.
+
+        Other processes using the wallet DB may have reserved or spent some of
+        the proofs since the inventory was loaded; those are forgotten and the
+        rest put back.
+        """
+        send_id = str(uuid.uuid1())
+        claimed = []
+        async with wallet.db.connect() as conn:
+            for proof in proofs:
+                result = await conn.execute(
+                    "UPDATE proofs SET reserved = :reserved, send_id = :send_id, "
+                    "time_reserved = :time_reserved "
+                    "WHERE secret = :secret AND (reserved IS NULL OR NOT reserved)",
+                    {
+                        "reserved": True,
+                        "send_id": send_id,
+                        "time_reserved": int(time.time()),
+                        "secret": proof.secret,
+                    },
+                )
+                if result.rowcount:
+                    claimed.append(proof)
+        if len(claimed) == len(proofs):
+            for proof in proofs:
+                proof.reserved = True
+            return True
+        await wallet.set_reserved_for_send(claimed, reserved=False)
+        for proof in claimed:
+            proof.reserved = False
+        self.inventory.forget([proof for proof in proofs if proof not in claimed])
+        self.inventory.put_back(claimed)
+        return False
+
+    async def _release(self, wallet, proofs):
+        await wallet.set_reserved_for_send(proofs, reserved=False)
+        for proof in proofs:
+            proof.reserved = False
+        self.inventory.put_back(proofs)
+
+    async def _take_proofs(self, amount):
+        async with self._lock.shared():
+            wallet = self.wallet
+            keyset_ids = self._spendable_keysets(wallet)
+            for _ in range(self.CLAIM_ATTEMPTS):
+                proofs = self.inventory.take(amount, keyset_ids)
+                if proofs is None:
+                    break
+                if await self._claim(wallet, proofs):
+                    return proofs
+
+        # No exact combination of proofs, swap some with the mint
+        async with self.borrow(exclusive=True) as wallet:
+            return await self._swap_for(wallet, amount)
+
+    async def _swap_for(self, wallet, amount):
+        keyset_ids = self._spendable_keysets(wallet)
+        for attempt in range(self.CLAIM_ATTEMPTS):
+            inputs = self.inventory.take_covering(
+                amount, keyset_ids, fees=wallet.get_fees_for_proofs
+            )
+            if inputs is None and attempt == 0:
+                # Other processes may have added proofs since the last reload
+                await self._reload_inventory(wallet)
+                continue
+            if inputs is None:
+                raise BalanceTooLowError()
+            if await self._claim(wallet, inputs):
+                break
+        else:
+            raise BalanceTooLowError()
+
+        # Keep the change in denominations future withdrawals will need
+        wallet.wanted_amounts = self._deficits(wallet)
+        try:
+            _, send_proofs = await wallet.split(inputs, amount)
+        except Exception:
+            await self._release(wallet, inputs)
+            raise
+        finally:
+            wallet.wanted_amounts = None
+        self.inventory.forget(inputs)
+        await spent_proofs.record(p.Y for p in inputs)
+        # Marked reserved, so returning the wallet doesn't add them to the inventory
+        await wallet.set_reserved_for_send(send_proofs, reserved=True)
+        return send_proofs
+
+    @asynccontextmanager
+    async def send_token(self, amount):
+        """Yield a token worth exactly ``amount`` from the bank's proofs.
+
+        The proofs are spent from the wallet when the block completes and given
+        back if it raises. Raises ``BalanceTooLowError`` if the wallet can't
+        cover ``amount``.
+        """
+        if not self.started or asyncio.get_running_loop() is not self._loop:
+            async with self.borrow(exclusive=True) as wallet:
+                await wallet.load_proofs(reload=True)
+                proofs, _ = await wallet.select_to_send(
+                    wallet.proofs, amount, set_reserved=True
+                )
+                try:
+                    yield await wallet.serialize_proofs(proofs)
+                except BaseException:
+                    await wallet.set_reserved_for_send(proofs, reserved=False)
+                    raise
+                await wallet.invalidate(proofs)
+            return
+
+        self.rebalancer.record(amount)
+        proofs = await self._take_proofs(amount)
+        try:
+            async with self._lock.shared():
+                token = await self.wallet.serialize_proofs(proofs)
+            yield token
+        except BaseException:
+            async with self._lock.shared():
+                await self._release(self.wallet, proofs)
+            raise
+        async with self._lock.shared():
+            await self.wallet.invalidate(proofs)
+        self.inventory.forget(proofs)
+
+
+wallet_manager = WalletManager()
@@ -7,10 +7,58 @@ For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
 """
 
+import logging
 import os
 
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "coinbank.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from accounts import spent_proofs  # noqa: E402
+from accounts.events import event_broker  # noqa: E402
+from accounts.mint_client import mint_client  # noqa: E402
+from accounts.wallet import wallet_manager  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+
+async def application(scope, receive, send):
+    """Django's ASGI app plus lifespan handling for process-wide resources.
+
+    Django itself does not speak the lifespan protocol, so startup and shutdown
+    are handled here. Servers without lifespan support get the shared wallet
+    opened on the first HTTP request instead.
+    """
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    await mint_client.start()
+                    await event_broker.start()
+                    await wallet_manager.start()
+                    spent_proofs.start()
+                except Exception as e:
+                    logger.exception("Startup failed")
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await wallet_manager.stop()
+                await event_broker.stop()
+                await mint_client.stop()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    if not wallet_manager.started:
+        await mint_client.start()
+        await event_broker.start()
+        spent_proofs.start()
+        try:
+            await wallet_manager.start()
+        except Exception:
+            # Views fall back to loading a wallet per request
+            logger.exception("Could not open the shared wallet")
+    await django_application(scope, receive, send)
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import copy
 import os
 from pathlib import Path
 
@@ -38,6 +39,39 @@ ALLOWED_HOSTS = []
 # Custom user model
 AUTH_USER_MODEL = "accounts.Account"
 
+# Logged-in users are cached in a cache shared between processes, see accounts.auth
+AUTHENTICATION_BACKENDS = ["accounts.auth.CachedModelBackend"]
+DJANGO_USER_CACHE_SECONDS = int(os.environ.get("DJANGO_USER_CACHE_SECONDS", "300"))
+# Balances are cached too, and updated whenever they change, but only in a cache
+# shared between processes (not LocMemCache), see accounts.balances
+DJANGO_BALANCE_CACHE_SECONDS = int(
+    os.environ.get("DJANGO_BALANCE_CACHE_SECONDS", "300")
+)
+
+# A cache in each process by default. With several workers use a shared one
+# (e.g. django.core.cache.backends.redis.RedisCache and a redis:// location):
+# sessions, users and balances are only cached in a shared cache, where every
+# worker sees logouts and account changes at once
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get(
+            "DJANGO_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.environ.get("DJANGO_CACHE_LOCATION", ""),
+    }
+}
+DJANGO_CACHE_SHARED = CACHES["default"]["BACKEND"] not in (
+    "django.core.cache.backends.dummy.DummyCache",
+    "django.core.cache.backends.locmem.LocMemCache",
+)
+
+# Sessions are read from the cache and written through to the database
+SESSION_ENGINE = (
+    "django.contrib.sessions.backends.cached_db"
+    if DJANGO_CACHE_SHARED
+    else "django.contrib.sessions.backends.db"
+)
+
 
 # Application definition
 
@@ -53,6 +87,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "accounts.routers.primary_pin_middleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -95,6 +130,64 @@ DATABASES = {
     }
 }
 
+# Threads (each with its own connection) running the ORM calls of async views
+# and background tasks, see accounts.db
+DJANGO_DB_THREADS = int(os.environ.get("DJANGO_DB_THREADS", "10"))
+
+# Connection handling, see "Database connections" in the README:
+# "off" (a connection per request), "persistent" (WSGI and management commands),
+# "pool" (psycopg 3 pool, for ASGI) or "pgbouncer" (behind a transaction pooler)
+DJANGO_DATABASE_POOL = os.environ.get("DJANGO_DATABASE_POOL", "off")
+if DJANGO_DATABASE_POOL == "persistent":
+    DATABASES["default"]["CONN_MAX_AGE"] = int(
+        os.environ.get("DJANGO_DATABASE_CONN_MAX_AGE", "600")
+    )
+    DATABASES["default"]["CONN_HEALTH_CHECKS"] = True
+elif DJANGO_DATABASE_POOL == "pool":
+    DATABASES["default"]["CONN_HEALTH_CHECKS"] = True
+    DATABASES["default"]["OPTIONS"] = {
+        "pool": {
+            "min_size": int(os.environ.get("DJANGO_DATABASE_POOL_MIN_SIZE", "2")),
+            "max_size": int(
+                os.environ.get(
+                    "DJANGO_DATABASE_POOL_MAX_SIZE", str(DJANGO_DB_THREADS + 4)
+                )
+            ),
+            "timeout": float(
+                os.environ.get("DJANGO_DATABASE_POOL_TIMEOUT_SECONDS", "10")
+            ),
+        }
+    }
+elif DJANGO_DATABASE_POOL == "pgbouncer":
+    # Transactions may run on a different server connection each time, so no
+    # session state: no server-side cursors (psycopg 3 prepared statements are
+    # already disabled by Django)
+    DATABASES["default"]["DISABLE_SERVER_SIDE_CURSORS"] = True
+elif DJANGO_DATABASE_POOL != "off":
+    raise ValueError(f"Unknown DJANGO_DATABASE_POOL {DJANGO_DATABASE_POOL!r}")
+# LISTEN needs a session of its own; behind a transaction pooler point the
+# events listener at Postgres directly
+DJANGO_EVENTS_LISTEN_HOST = os.environ.get("DJANGO_EVENTS_LISTEN_HOST", "")
+DJANGO_EVENTS_LISTEN_PORT = os.environ.get("DJANGO_EVENTS_LISTEN_PORT", "")
+
+# Read replicas ("host[:port],..."), used by read-only views and reporting,
+# see accounts.routers. Tests read from the default test database instead.
+DJANGO_DATABASE_REPLICAS = []
+for _index, _address in enumerate(
+    filter(None, os.environ.get("DJANGO_DATABASE_REPLICA_HOSTS", "").split(","))
+):
+    _host, _, _port = _address.strip().partition(":")
+    DATABASES[f"replica_{_index}"] = {
+        **copy.deepcopy(DATABASES["default"]),
+        "HOST": _host,
+        "PORT": _port or DATABASES["default"]["PORT"],
+        "TEST": {"MIRROR": "default"},
+    }
+    DJANGO_DATABASE_REPLICAS.append(f"replica_{_index}")
+DATABASE_ROUTERS = ["accounts.routers.ReplicaRouter"]
+# How long a client's reads stay on the primary after it changed something
+DJANGO_REPLICA_PIN_SECONDS = int(os.environ.get("DJANGO_REPLICA_PIN_SECONDS", "10"))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -142,8 +235,100 @@ CORS_ALLOWED_ORIGINS = [
     "http://127.0.0.1:3000",
 ]
 
+DJANGO_MINT_URL = os.environ["DJANGO_MINT_URL"]
+
 DJANGO_BANK_WALLET = os.environ["DJANGO_BANK_WALLET"]
 DJANGO_BANK_WALLET_CASHU_DIR = os.environ["DJANGO_BANK_WALLET_CASHU_DIR"]
+# How often the shared wallet checks the mint for keyset changes
+DJANGO_BANK_WALLET_REFRESH_SECONDS = int(
+    os.environ.get("DJANGO_BANK_WALLET_REFRESH_SECONDS", "300")
+)
+# How often a worker rereads its proof inventory from the wallet DB, to pick up
+# proofs other processes (e.g. the settlement worker) added
+DJANGO_PROOF_INVENTORY_RELOAD_SECONDS = int(
+    os.environ.get("DJANGO_PROOF_INVENTORY_RELOAD_SECONDS", "60")
+)
+# How often an idle worker swaps proofs into the denominations withdrawals need
+DJANGO_REBALANCE_INTERVAL_SECONDS = int(
+    os.environ.get("DJANGO_REBALANCE_INTERVAL_SECONDS", "30")
+)
+# Number of recent withdrawal amounts the denomination targets are learned from
+DJANGO_REBALANCE_HISTORY_SIZE = int(
+    os.environ.get("DJANGO_REBALANCE_HISTORY_SIZE", "500")
+)
+# Number of withdrawals like the recent ones to keep denominations in stock for
+DJANGO_REBALANCE_HORIZON = int(os.environ.get("DJANGO_REBALANCE_HORIZON", "50"))
+# Maximum number of proofs swapped in one rebalancing swap
+DJANGO_REBALANCE_MAX_INPUTS = int(os.environ.get("DJANGO_REBALANCE_MAX_INPUTS", "100"))
+# Maximum number of tokens per batch redemption
+DJANGO_REDEEM_BATCH_MAX_SIZE = int(
+    os.environ.get("DJANGO_REDEEM_BATCH_MAX_SIZE", "1000")
+)
+# Maximum number of proofs combined into one swap with the mint
+DJANGO_REDEEM_SWAP_MAX_PROOFS = int(
+    os.environ.get("DJANGO_REDEEM_SWAP_MAX_PROOFS", "500")
+)
+# Expected number of spent proofs and false positive rate of the per-process
+# Bloom filter in front of the spent proof index (about 1.8 MB at the defaults)
+DJANGO_SPENT_BLOOM_CAPACITY = int(
+    os.environ.get("DJANGO_SPENT_BLOOM_CAPACITY", "1000000")
+)
+DJANGO_SPENT_BLOOM_ERROR_RATE = float(
+    os.environ.get("DJANGO_SPENT_BLOOM_ERROR_RATE", "0.001")
+)
+# Timeout for requests to the mint made outside the cashu wallet
+DJANGO_MINT_HTTP_TIMEOUT_SECONDS = float(
+    os.environ.get("DJANGO_MINT_HTTP_TIMEOUT_SECONDS", "10")
+)
+# Age after which /accounts/info/ refreshes mint info in the background
+DJANGO_MINT_INFO_TTL_SECONDS = int(os.environ.get("DJANGO_MINT_INFO_TTL_SECONDS", "60"))
+# Deposit settlement worker (manage.py settledeposits): seconds between passes,
+# quotes checked concurrently per batch and the longest backoff for unpaid quotes
+DJANGO_SETTLEMENT_INTERVAL_SECONDS = float(
+    os.environ.get("DJANGO_SETTLEMENT_INTERVAL_SECONDS", "2")
+)
+DJANGO_SETTLEMENT_BATCH_SIZE = int(os.environ.get("DJANGO_SETTLEMENT_BATCH_SIZE", "50"))
+DJANGO_SETTLEMENT_MAX_BACKOFF_SECONDS = float(
+    os.environ.get("DJANGO_SETTLEMENT_MAX_BACKOFF_SECONDS", "30")
+)
+# Expired deposits are checked with the mint until the mint's quote expires (and
+# credited if they were paid after all), but no longer than this after expiry
+DJANGO_SETTLEMENT_RECHECK_SECONDS = float(
+    os.environ.get("DJANGO_SETTLEMENT_RECHECK_SECONDS", "86400")
+)
+# Account events for /accounts/events/: "local" delivers within one process,
+# "postgres" uses LISTEN/NOTIFY so all workers (and settledeposits) see them
+DJANGO_EVENTS_BACKEND = os.environ.get("DJANGO_EVENTS_BACKEND", "local")
+DJANGO_EVENTS_QUEUE_SIZE = int(os.environ.get("DJANGO_EVENTS_QUEUE_SIZE", "100"))
+DJANGO_EVENTS_KEEPALIVE_SECONDS = float(
+    os.environ.get("DJANGO_EVENTS_KEEPALIVE_SECONDS", "15")
+)
+# Number of rows each running total for /accounts/stats/ is spread over
+DJANGO_AGGREGATE_SHARDS = int(os.environ.get("DJANGO_AGGREGATE_SHARDS", "8"))
+# How long cached mint info and keysets are trusted without asking the mint
+DJANGO_MINT_CACHE_TTL_SECONDS = int(
+    os.environ.get("DJANGO_MINT_CACHE_TTL_SECONDS", "3600")
+)
+# Pending payment requests are swept this long after they expired
+DJANGO_EXPIRY_GRACE_SECONDS = float(
+    os.environ.get("DJANGO_EXPIRY_GRACE_SECONDS", "600")
+)
+# Payment requests expired per UPDATE by the expirepayments sweeper
+DJANGO_EXPIRY_BATCH_SIZE = int(os.environ.get("DJANGO_EXPIRY_BATCH_SIZE", "1000"))
+# Settled payment requests are moved to the archive table after this many days
+DJANGO_ARCHIVE_AFTER_DAYS = float(os.environ.get("DJANGO_ARCHIVE_AFTER_DAYS", "90"))
+# Payment requests moved per transaction by archivepayments
+DJANGO_ARCHIVE_BATCH_SIZE = int(os.environ.get("DJANGO_ARCHIVE_BATCH_SIZE", "1000"))
+# Maximum number of transfers in one /accounts/send/batch/ request
+DJANGO_TRANSFER_BATCH_MAX_SIZE = int(
+    os.environ.get("DJANGO_TRANSFER_BATCH_MAX_SIZE", "10000")
+)
+# Retries of transfers aborted by a deadlock or serialization failure
+DJANGO_TRANSFER_MAX_RETRIES = int(os.environ.get("DJANGO_TRANSFER_MAX_RETRIES", "5"))
+# Base of the jittered exponential backoff between those retries
+DJANGO_TRANSFER_RETRY_BACKOFF_SECONDS = float(
+    os.environ.get("DJANGO_TRANSFER_RETRY_BACKOFF_SECONDS", "0.02")
+)
 
 DJANGO_BANK_NAME = os.environ["DJANGO_BANK_NAME"]
 DJANGO_COIN_NAME = os.environ["DJANGO_COIN_NAME"]
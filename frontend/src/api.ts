@@ -67,6 +67,8 @@ export interface Stats {
   coin_name: string
   coin_symbol: string
   wallet_api_url?: string
+  // Only for bank staff
+  transfer_retries?: Record<string, number>
 }
 
 export interface LoginResponse {
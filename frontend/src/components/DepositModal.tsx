@@ -15,6 +15,9 @@ type DepositMethod = 'lightning' | 'token'
 type DepositStep = 'method' | 'amount' | 'invoice' | 'token' | 'success' | 'error' | 'expired'
 
 const POLL_INTERVAL_MS = 3000 // Poll every 3 seconds
+// Polling while the event stream delivers the settlement worker's events,
+// in case one is missed
+const SLOW_POLL_INTERVAL_MS = 15000
 
 function DepositModal({ isOpen, onClose, coinName, coinSymbol, onDeposit }: DepositModalProps) {
   const [step, setStep] = useState<DepositStep>('method')
@@ -69,7 +72,7 @@ function DepositModal({ isOpen, onClose, coinName, coinSymbol, onDeposit }: Depo
     return () => document.removeEventListener('mousedown', handleClickOutside)
   }, [isOpen, onClose, step])
 
-  // Poll for payment status when we have an invoice
+  // Check payment status when we have an invoice
   const checkPaymentStatus = useCallback(async () => {
     if (!quoteId) return
 
@@ -107,16 +110,45 @@ function DepositModal({ isOpen, onClose, coinName, coinSymbol, onDeposit }: Depo
     }
   }, [quoteId, onDeposit])
 
-  // Start polling when we have an invoice
+  // Wait for the invoice to be settled: poll, and listen for server-sent
+  // events. Poll slowly only once the stream says it gets the events of the
+  // settlement worker (the postgres events backend)
   useEffect(() => {
-    if (step === 'invoice' && quoteId && !pollIntervalRef.current) {
-      // Start polling
-      pollIntervalRef.current = window.setInterval(checkPaymentStatus, POLL_INTERVAL_MS)
-      // Also check immediately
-      checkPaymentStatus()
+    if (step !== 'invoice' || !quoteId) return
+
+    const startPolling = (interval: number) => {
+      if (pollIntervalRef.current) {
+        clearInterval(pollIntervalRef.current)
+      }
+      pollIntervalRef.current = window.setInterval(checkPaymentStatus, interval)
+    }
+
+    let events: EventSource | null = null
+    if (typeof EventSource !== 'undefined') {
+      events = new EventSource('/api/accounts/events/', { withCredentials: true })
+      events.addEventListener('stream', (event) => {
+        const data = JSON.parse((event as MessageEvent).data)
+        if (data.cross_process) {
+          startPolling(SLOW_POLL_INTERVAL_MS)
+        }
+      })
+      events.addEventListener('payment_request', (event) => {
+        const data = JSON.parse((event as MessageEvent).data)
+        if (data.quote_id === quoteId) {
+          checkPaymentStatus()
+        }
+      })
+      events.onerror = () => {
+        events?.close()
+        startPolling(POLL_INTERVAL_MS)
+      }
     }
+    startPolling(POLL_INTERVAL_MS)
+    // Also check immediately
+    checkPaymentStatus()
 
     return () => {
+      events?.close()
       if (pollIntervalRef.current) {
         clearInterval(pollIntervalRef.current)
         pollIntervalRef.current = null